@@ -15,3 +15,19 @@ class AnnasArchiveStore(StoreBase):
 
     def is_customizable(self):
         return True
+
+    def cli_main(self, args):
+        """
+        calibre-debug -r "Anna's Archive" -- search QUERY, see cli.py for the options.
+        """
+        import os
+        import sys
+        from calibre.constants import config_dir
+        from calibre.utils.config import JSONConfig
+        from calibre.utils.filenames import ascii_filename
+        from calibre_plugins.store_annas_archive.cli import main
+
+        # The settings of the store, the same file StorePlugin uses
+        config = JSONConfig('store/stores/' + ascii_filename(self.name))
+        data_dir = os.path.join(config_dir, 'plugins', 'store_annas_archive')
+        sys.exit(main(args[1:], config, os.path.join(data_dir, 'cache.sqlite'), os.path.join(data_dir, 'index.sqlite')))
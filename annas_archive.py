@@ -1,193 +1,108 @@
+import os
 from contextlib import closing
-from http.client import RemoteDisconnected
-from math import ceil
-from typing import Generator
-from urllib.error import HTTPError, URLError
-from urllib.parse import quote_plus
-from urllib.request import urlopen, Request
-
-from calibre import browser
-from calibre.gui2 import open_url
+from typing import Dict, Generator, Iterable, Optional, Tuple, TYPE_CHECKING
+
+from calibre import prints
+from calibre.constants import config_dir
 from calibre.gui2.store import StorePlugin
 from calibre.gui2.store.search_result import SearchResult
-from calibre.gui2.store.web_store_dialog import WebStoreDialog
-from calibre_plugins.store_annas_archive.constants import DEFAULT_MIRRORS, RESULTS_PER_PAGE, SearchOption
-from lxml import html
 
-try:
-    from qt.core import QUrl
-except (ImportError, ModuleNotFoundError):
-    from PyQt5.Qt import QUrl
+if TYPE_CHECKING:
+    from calibre_plugins.store_annas_archive.core import AnnasArchive
+    from calibre_plugins.store_annas_archive.results import Row
 
 SearchResults = Generator[SearchResult, None, None]
+BatchResults = Generator[Tuple[str, SearchResult], None, None]
 
 
 class AnnasArchiveStore(StorePlugin):
+    """
+    Connects the GUI-free AnnasArchive core to calibre's Get books dialog.
+    calibre creates the store when it starts, so the core, and lxml and the network code with it,
+    is only imported and set up once it is first used.
+    """
 
     def __init__(self, gui, name, config=None, base_plugin=None):
         super().__init__(gui, name, config, base_plugin)
-        self.working_mirror = None
-
-    def _search(self, url: str, max_results: int, timeout: int) -> SearchResults:
-        br = browser()
-        doc = None
-        counter = max_results
-
-        for page in range(1, ceil(max_results / RESULTS_PER_PAGE) + 1):
-            mirrors = self.config.get('mirrors', DEFAULT_MIRRORS)
-            if self.working_mirror is not None:
-                mirrors.remove(self.working_mirror)
-                mirrors.insert(0, self.working_mirror)
-            for mirror in mirrors:
-                with closing(br.open(url.format(base=mirror, page=page), timeout=timeout)) as resp:
-                    if resp.code < 500 or resp.code > 599:
-                        self.working_mirror = mirror
-                        doc = html.fromstring(resp.read())
-                        break
-            if doc is None:
-                self.working_mirror = None
-                raise Exception('No working mirrors of Anna\'s Archive found.')
-
-            books = doc.xpath('//table/tr')
-            for book in books:
-                if counter <= 0:
-                    break
-
-                columns = book.findall("td")
-                s = SearchResult()
-
-                cover = columns[0].xpath('./a[@tabindex="-1"]')
-                if cover:
-                    cover = cover[0]
-                else:
-                    continue
-                s.detail_item = cover.get('href', '').split('/')[-1]
-                if not s.detail_item:
-                    continue
-
-                s.cover_url = ''.join(cover.xpath('(./span/img/@src)[1]'))
-                s.title = ''.join(columns[1].xpath('./a/span/text()'))
-                s.author = ''.join(columns[2].xpath('./a/span/text()'))
-                s.formats = ''.join(columns[9].xpath('./a/span/text()')).upper()
-
-                s.price = '$0.00'
-                s.drm = SearchResult.DRM_UNLOCKED
-
-                counter -= 1
-                yield s
+        self._core = None
+
+    @property
+    def core(self) -> 'AnnasArchive':
+        if self._core is None:
+            from calibre_plugins.store_annas_archive.core import AnnasArchive
+            data_dir = os.path.join(config_dir, 'plugins', 'store_annas_archive')
+            self._core = AnnasArchive(self.config, os.path.join(data_dir, 'cache.sqlite'),
+                                      os.path.join(data_dir, 'index.sqlite'), os.path.join(data_dir, 'covers'), prints)
+        return self._core
+
+    @property
+    def loaded_core(self) -> Optional['AnnasArchive']:
+        """
+        The core if it has been set up already, so the settings can show its state without setting it up.
+        """
+        return self._core
+
+    @staticmethod
+    def _make_result(row) -> SearchResult:
+        s = SearchResult()
+        s.detail_item, s.title, s.author, s.formats, s.cover_url = row
+        s.price = '$0.00'
+        s.drm = SearchResult.DRM_UNLOCKED
+        return s
 
     def search(self, query, max_results=10, timeout=60) -> SearchResults:
-        url = f'{{base}}/search?page={{page}}&q={quote_plus(query)}&display=table'
-        search_opts = self.config.get('search', {})
-        for option in SearchOption.options:
-            value = search_opts.get(option.config_option, ())
-            if isinstance(value, str):
-                value = (value,)
-            for item in value:
-                url += f'&{option.url_param}={item}'
-        yield from self._search(url, max_results, timeout)
+        results: Dict[str, SearchResult] = {}
+
+        def fetched(row: 'Row', cover: bytes):
+            # calibre shows it the next time it draws the results
+            results[row.md5].cover_data = cover
+
+        cached_covers = self.core.covers is not None
+        with closing(self.core.search(query, max_results, timeout)) as rows:
+            for row, cover in self.core.with_covers(rows, fetched):
+                s = self._make_result(row)
+                if cached_covers:
+                    # The plugin downloads the covers into its cache, calibre only downloads one too if there is a url
+                    s.cover_data = cover
+                    s.cover_url = ''
+                results[row.md5] = s
+                yield s
+
+    def search_many(self, queries: Iterable[str], max_results=10, timeout=60, **kwargs) -> BatchResults:
+        """
+        See AnnasArchive.search_many, this yields SearchResults instead of rows.
+        """
+        for query, row in self.core.search_many(queries, max_results, timeout, **kwargs):
+            yield query, self._make_result(row)
 
     def open(self, parent=None, detail_item=None, external=False):
+        # Qt is only needed once something is shown
+        from calibre.gui2 import open_url
+        from calibre.gui2.store.web_store_dialog import WebStoreDialog
+        try:
+            from qt.core import QUrl
+        except (ImportError, ModuleNotFoundError):
+            from PyQt5.Qt import QUrl
+
         if detail_item:
-            url = self._get_url(detail_item)
+            url = self.core.get_url(detail_item)
         else:
-            if self.working_mirror is not None:
-                url = self.working_mirror
-            else:
-                url = self.config.get('mirrors', DEFAULT_MIRRORS)[0]
+            url = self.core.get_mirror()
         if external or self.config.get('open_external', False):
             open_url(QUrl(url))
         else:
-            d = WebStoreDialog(self.gui, self.working_mirror, parent, url)
+            d = WebStoreDialog(self.gui, self.core.working_mirror, parent, url)
             d.setWindowTitle(self.name)
             d.set_tags(self.config.get('tags', ''))
             d.exec()
 
     def get_details(self, search_result: SearchResult, timeout=60):
-        if not search_result.formats:
-            return
-
-        _format = '.' + search_result.formats.lower()
-
-        link_opts = self.config.get('link', {})
-        url_extension = link_opts.get('url_extension', True)
-        content_type = link_opts.get('content_type', False)
-
-        br = browser()
-        with closing(br.open(self._get_url(search_result.detail_item), timeout=timeout)) as f:
-            doc = html.fromstring(f.read())
-
-        for link in doc.xpath('//div[@id="md5-panel-downloads"]/ul[contains(@class, "list-inside")]/li/a[contains(@class, "js-download-link")]'):
-            url = link.get('href')
-            link_text = ''.join(link.itertext())
-
-            if link_text == 'Libgen.li':
-                url = self._get_libgen_link(url, br)
-            elif link_text == 'Libgen.rs Fiction' or link_text == 'Libgen.rs Non-Fiction':
-                url = self._get_libgen_nonfiction_link(url, br)
-            elif link_text.startswith('Sci-Hub'):
-                url = self._get_scihub_link(url, br)
-            elif link_text == 'Z-Library':
-                url = self._get_zlib_link(url, br)
-            else:
-                continue
-
-            if not url:
-                continue
-
-            # Takes longer, but more accurate
-            if content_type:
-                try:
-                    with urlopen(Request(url, method='HEAD'), timeout=timeout) as resp:
-                        if resp.info().get_content_maintype() != 'application':
-                            continue
-                except (HTTPError, URLError, TimeoutError, RemoteDisconnected):
-                    pass
-            elif url_extension:
-                # Speeds it up by checking the extension of the url.
-                # Might miss a direct url that doesn't end with the extension
-                params = url.find("?")
-                if params < 0:
-                    params = None
-                if url.endswith(_format, 0, params):
-                    continue
-            search_result.downloads[f"{link_text}.{search_result.formats}"] = url
-
-    @staticmethod
-    def _get_libgen_link(url: str, br) -> str:
-        with closing(br.open(url)) as resp:
-            doc = html.fromstring(resp.read())
-            scheme, _, host, _ = resp.geturl().split('/', 3)
-        url = ''.join(doc.xpath('//a[h2[text()="GET"]]/@href'))
-        return f"{scheme}//{host}/{url}"
-
-    @staticmethod
-    def _get_libgen_nonfiction_link(url: str, br) -> str:
-        with closing(br.open(url)) as resp:
-            doc = html.fromstring(resp.read())
-        url = ''.join(doc.xpath('//h2/a[text()="GET"]/@href'))
-        return url
-
-    @staticmethod
-    def _get_scihub_link(url, br):
-        with closing(br.open(url)) as resp:
-            doc = html.fromstring(resp.read())
-            scheme, _ = resp.geturl().split('/', 1)
-        url = ''.join(doc.xpath('//embed[@id="pdf"]/@src'))
-        if url:
-            return scheme + url
-
-    @staticmethod
-    def _get_zlib_link(url, br):
-        with closing(br.open(url)) as resp:
-            doc = html.fromstring(resp.read())
-            scheme, _, host, _ = resp.geturl().split('/', 3)
-        url = ''.join(doc.xpath('//a[contains(@class, "addDownloadedBook")]/@href'))
-        if url:
-            return f"{scheme}//{host}/{url}"
+        def verified(downloads: Dict[str, str]):
+            # A new dict, calibre may be going through the old one
+            search_result.downloads = downloads
 
-    def _get_url(self, md5):
-        return f"{self.working_mirror}/md5/{md5}"
+        search_result.downloads.update(
+            self.core.get_downloads(search_result.detail_item, search_result.formats, timeout, verified))
 
     def config_widget(self):
         from calibre_plugins.store_annas_archive.config import ConfigWidget
@@ -195,3 +110,5 @@ class AnnasArchiveStore(StorePlugin):
 
     def save_settings(self, config_widget):
         config_widget.save_settings()
+        if self._core is not None:
+            self._core.apply_settings()
@@ -0,0 +1,148 @@
+from threading import Event, Thread
+
+try:
+    from qt.core import (Qt, QObject, pyqtSignal, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPlainTextEdit,
+                         QPushButton, QSpinBox, QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView,
+                         QDialogButtonBox)
+except (ImportError, ModuleNotFoundError):
+    from PyQt5.QtCore import Qt, QObject, pyqtSignal
+    from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPlainTextEdit, QPushButton, QSpinBox,
+                                 QTableWidget, QTableWidgetItem, QAbstractItemView, QHeaderView, QDialogButtonBox)
+
+load_translations()
+
+
+class _Signals(QObject):
+    result = pyqtSignal(str, object)
+    query_done = pyqtSignal(str)
+    finished = pyqtSignal()
+
+
+class BatchSearchDialog(QDialog):
+    """
+    Searches for many queries at once with AnnasArchiveStore.search_many, e.g. for the selected books in the library.
+    """
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.setWindowTitle(_('Batch search'))
+        self.resize(700, 600)
+        self._thread = None
+        self._stop = Event()
+        self._results = []
+        self._total = self._done = 0
+        self.signals = _Signals()
+        self.signals.result.connect(self.add_result, Qt.ConnectionType.QueuedConnection)
+        self.signals.query_done.connect(self.query_done, Qt.ConnectionType.QueuedConnection)
+        self.signals.finished.connect(self.search_finished, Qt.ConnectionType.QueuedConnection)
+
+        layout = QVBoxLayout(self)
+        self.queries = QPlainTextEdit(self)
+        self.queries.setPlaceholderText(_('One title, author or ISBN per line'))
+        layout.addWidget(self.queries, 1)
+
+        buttons = QHBoxLayout()
+        add_books = QPushButton(_('Add selected books'), self)
+        add_books.setToolTip(_('Add the ISBN, or the title and author, of the books selected in the library'))
+        add_books.clicked.connect(self.add_selected_books)
+        add_books.setEnabled(getattr(store.gui, 'library_view', None) is not None)
+        buttons.addWidget(add_books)
+        buttons.addStretch()
+        buttons.addWidget(QLabel(_('Results per query:'), self))
+        self.max_results = QSpinBox(self)
+        self.max_results.setRange(1, 100)
+        self.max_results.setValue(5)
+        buttons.addWidget(self.max_results)
+        self.start = QPushButton(_('Search'), self)
+        self.start.clicked.connect(self.toggle_search)
+        buttons.addWidget(self.start)
+        layout.addLayout(buttons)
+
+        self.table = QTableWidget(0, 4, self)
+        self.table.setHorizontalHeaderLabels([_('Query'), _('Title'), _('Author'), _('Format')])
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.verticalHeader().setVisible(False)
+        self.table.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        self.table.setToolTip(_('Double click a result to open it'))
+        self.table.cellDoubleClicked.connect(self.open_result)
+        layout.addWidget(self.table, 2)
+
+        self.status = QLabel(self)
+        layout.addWidget(self.status)
+
+        button_box = QDialogButtonBox(QDialogButtonBox.StandardButton.Close, self)
+        button_box.rejected.connect(self.reject)
+        layout.addWidget(button_box)
+
+    def add_selected_books(self):
+        gui = self.store.gui
+        db = gui.current_db.new_api
+        queries = []
+        for book_id in gui.library_view.get_selected_ids():
+            isbn = db.field_for('identifiers', book_id).get('isbn')
+            if isbn:
+                queries.append(isbn)
+            else:
+                authors = db.field_for('authors', book_id)
+                queries.append(' '.join((db.field_for('title', book_id), *authors[:1])))
+        if queries:
+            text = self.queries.toPlainText().rstrip()
+            self.queries.setPlainText('\n'.join(([text] if text else []) + queries))
+
+    def toggle_search(self):
+        if self._thread is not None:
+            self._stop.set()
+            self.start.setEnabled(False)
+            return
+        queries = [query for line in self.queries.toPlainText().splitlines() if (query := line.strip())]
+        if not queries:
+            return
+        self.table.setRowCount(0)
+        self._results = []
+        self._total = len(set(queries))
+        self._done = 0
+        self._stop = Event()
+        self.start.setText(_('Stop'))
+        self.update_status()
+        self._thread = Thread(target=self.run, args=(queries, self.max_results.value()), name='AnnasArchiveBatch',
+                              daemon=True)
+        self._thread.start()
+
+    def run(self, queries, max_results):
+        try:
+            for query, result in self.store.search_many(queries, max_results, done=self.signals.query_done.emit,
+                                                        stop=self._stop):
+                self.signals.result.emit(query, result)
+        finally:
+            self.signals.finished.emit()
+
+    def add_result(self, query, result):
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for column, text in enumerate((query, result.title, result.author, result.formats)):
+            self.table.setItem(row, column, QTableWidgetItem(text))
+        self._results.append(result)
+        self.update_status()
+
+    def query_done(self, query):
+        self._done += 1
+        self.update_status()
+
+    def search_finished(self):
+        self._thread = None
+        self.start.setText(_('Search'))
+        self.start.setEnabled(True)
+        self.update_status()
+
+    def update_status(self):
+        self.status.setText(_('{done} of {total} queries searched, {results} results').format(
+            done=self._done, total=self._total, results=len(self._results)))
+
+    def open_result(self, row, column):
+        self.store.open(self, self._results[row].detail_item)
+
+    def reject(self):
+        self._stop.set()
+        super().reject()
@@ -0,0 +1,170 @@
+"""
+End-to-end benchmark of searches and download link lookups against local mock mirrors, no network needed.
+For every scenario it measures the time to the first result, the total time, the number of requests
+and the number of bytes sent by the mock servers, and writes the results as JSON.
+The first run of a scenario uses a new store, the second one reuses it so connections and mirror scores are warm.
+
+It uses the GUI-free core of the plugin, so it runs with plain python: python benchmarks/bench_e2e.py
+With calibre-debug -e options can't be passed on the command line, set them in the BENCH_ARGS environment variable.
+"""
+import argparse
+import json
+import os
+import shlex
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import plugin  # noqa: E402
+from mock_mirror import MockMirror  # noqa: E402
+
+plugin.load()
+
+# Each scenario is a list of mirrors, in the order they are configured
+SCENARIOS = {
+    'healthy': [{}, {}, {}],
+    'latency': [{'latency': 0.2}, {'latency': 0.2}, {'latency': 0.2}],
+    'flaky': [{'error_rate': 0.3}, {'error_rate': 0.3}, {'error_rate': 0.3}],
+    'first_mirror_down': [{'error_rate': 1.0}, {}, {}],
+    'first_mirror_hangs': [{'timeout_rate': 1.0}, {}, {}],
+    'slow_stream': [{'chunk_delay': 0.05, 'chunk_size': 4096}, {}, {}],
+}
+
+
+def run(store, mirrors, query: str, max_results: int, details: int, timeout: int, read_time: float,
+        covers: bool) -> dict:
+    for mirror in mirrors:
+        mirror.reset_counters()
+
+    errors = []
+    start = time.perf_counter()
+    first = None
+    results = []
+    try:
+        rows = store.search(query, max_results=max_results, timeout=timeout)
+        if covers:
+            rows = (row for row, _ in store.with_covers(rows))
+        for row in rows:
+            if first is None:
+                first = time.perf_counter() - start
+            results.append(row)
+    except Exception as e:
+        errors.append(f'search: {e!r}')
+    search_time = time.perf_counter() - start
+    if covers:
+        # So the covers are all counted in this run, and in the cache for the next one
+        store.cover_prefetcher.join(timeout)
+    # The user reading the results, prefetches run in the meantime
+    time.sleep(read_time)
+
+    start = time.perf_counter()
+    links = 0
+    for md5, _, _, formats, _ in results[:details]:
+        try:
+            links += len(store.get_downloads(md5, formats, timeout=timeout))
+        except Exception as e:
+            errors.append(f'get_downloads: {e!r}')
+    details_time = time.perf_counter() - start
+
+    return {
+        'results': len(results),
+        'time_to_first_result': first,
+        'search_time': search_time,
+        'details': min(details, len(results)),
+        'details_time': details_time,
+        'download_links': links,
+        'requests': sum(mirror.requests for mirror in mirrors),
+        'bytes': sum(mirror.bytes_sent for mirror in mirrors),
+        'errors': errors,
+    }
+
+
+def bench(name: str, query: str, max_results: int, details: int, timeout: int, concurrent_pages: int,
+          cache: bool, index: bool, rate_limit: int, prefetch: int, read_time: float, covers: bool) -> dict:
+    from calibre_plugins.store_annas_archive.core import AnnasArchive
+
+    mirrors = [MockMirror(seed=i, hang=timeout * 2, **options).start() for i, options in enumerate(SCENARIOS[name])]
+    cache_dir = tempfile.TemporaryDirectory()
+    try:
+        config = {
+            'mirrors': [mirror.url for mirror in mirrors],
+            'concurrent_pages': concurrent_pages,
+            'cache': {'enabled': cache},
+            'index': {'enabled': index},
+            'rate_limit': rate_limit,
+            'prefetch': prefetch,
+            'covers': {'enabled': covers},
+            # Don't let a background probe add requests to the measurements
+            'mirror_probe_time': time.time(),
+        }
+        store = AnnasArchive(config, os.path.join(cache_dir.name, 'cache.sqlite'),
+                             os.path.join(cache_dir.name, 'index.sqlite'), os.path.join(cache_dir.name, 'covers'))
+        return {
+            'cold': run(store, mirrors, query, max_results, details, timeout, read_time, covers),
+            'warm': run(store, mirrors, query, max_results, details, timeout, read_time, covers),
+        }
+    finally:
+        for mirror in mirrors:
+            mirror.stop()
+        cache_dir.cleanup()
+
+
+def compare(previous: dict, current: dict):
+    print(f"{'scenario':<20} {'run':<5} {'metric':<22} {'before':>10} {'after':>10} {'change':>8}")
+    for name, runs in current['scenarios'].items():
+        for run_name, metrics in runs.items():
+            old_metrics = previous.get('scenarios', {}).get(name, {}).get(run_name)
+            if not old_metrics:
+                continue
+            for metric, value in metrics.items():
+                old = old_metrics.get(metric)
+                if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                    continue
+                print(f'{name:<20} {run_name:<5} {metric:<22} {old:>10.3f} {value:>10.3f} {(value - old) / old:>+8.1%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=SCENARIOS, help='Scenarios to run, default all')
+    parser.add_argument('--query', default='example')
+    parser.add_argument('--max-results', type=int, default=300)
+    parser.add_argument('--details', type=int, default=5, help='Number of results to look up the download links of')
+    parser.add_argument('--timeout', type=int, default=5)
+    parser.add_argument('--concurrent-pages', type=int, default=4)
+    parser.add_argument('--cache', action='store_true', help='Enable the search cache')
+    parser.add_argument('--index', action='store_true', help='Enable the index of seen results')
+    parser.add_argument('--rate-limit', type=int, default=0, help='Requests per second to the mirrors, 0 for no limit')
+    parser.add_argument('--prefetch', type=int, default=0, help='Results to prefetch the download links of')
+    parser.add_argument('--read-time', type=float, default=0, help='Seconds between a search and the lookups')
+    parser.add_argument('--covers', action='store_true', help='Download the covers of the results too')
+    parser.add_argument('--output', default='bench_e2e.json', help='File to write the results to')
+    parser.add_argument('--compare', help='Results of a previous run to compare with')
+    args = parser.parse_args(shlex.split(os.environ.get('BENCH_ARGS', '')) or sys.argv[1:])
+
+    results = {
+        'settings': {key: value for key, value in vars(args).items() if key not in ('output', 'compare')},
+        'scenarios': {},
+    }
+    for name in args.scenario or SCENARIOS:
+        print(f'Running {name}...', file=sys.stderr)
+        results['scenarios'][name] = bench(name, args.query, args.max_results, args.details, args.timeout,
+                                           args.concurrent_pages, args.cache, args.index, args.rate_limit,
+                                           args.prefetch, args.read_time, args.covers)
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results['scenarios'], indent=2))
+
+    if previous is not None:
+        compare(previous, results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of the search results parser on fixture pages of 100, 1,000 and 10,000 rows.
+Reports rows per second, the memory blocks still allocated after the parse and the peak traced memory
+for each page size.
+
+Usage: python benchmarks/bench_parse.py [--repeat N] [--chunk-size BYTES]
+"""
+import argparse
+import gc
+import hashlib
+import os
+import time
+import tracemalloc
+
+import plugin
+
+plugin.load()
+from calibre_plugins.store_annas_archive.results import parse_rows  # noqa: E402
+
+SIZES = (100, 1000, 10000)
+
+
+def make_page(rows: int) -> bytes:
+    with open(os.path.join(plugin.FIXTURES, 'search_row.html'), encoding='utf-8') as f:
+        row = f.read().strip()
+    with open(os.path.join(plugin.FIXTURES, 'search_page.html'), encoding='utf-8') as f:
+        page = f.read()
+    return page.replace('{rows}', ''.join(
+        row.replace('{md5}', hashlib.md5(str(i).encode()).hexdigest()).replace('{i}', str(i))
+        for i in range(rows)
+    )).encode('utf-8')
+
+
+def chunked(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+
+
+def bench(page: bytes, expected: int, repeat: int, chunk_size: int) -> dict:
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        count = sum(1 for _ in parse_rows(chunked(page, chunk_size)))
+        elapsed = time.perf_counter() - start
+        assert count == expected, f'parsed {count} rows, expected {expected}'
+        best = elapsed if best is None else min(best, elapsed)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in parse_rows(chunked(page, chunk_size)):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    # tracemalloc only sees the blocks that are alive, not how many were allocated and freed along the way
+    retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename') if stat.count_diff > 0)
+
+    return {
+        'rows': expected,
+        'bytes': len(page),
+        'seconds': best,
+        'rows_per_second': expected / best,
+        'retained_blocks': retained,
+        'peak_kib': peak / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Number of timed runs per page size, the best is kept')
+    parser.add_argument('--chunk-size', type=int, default=16 * 1024, help='Size of the chunks fed to the parser')
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'page KiB':>10} {'rows/sec':>12} {'retained blocks':>16} {'peak KiB':>10}")
+    for size in SIZES:
+        result = bench(make_page(size), size, args.repeat, args.chunk_size)
+        print(f"{result['rows']:>8} {result['bytes'] / 1024:>10.0f} {result['rows_per_second']:>12.0f} "
+              f"{result['retained_blocks']:>16} {result['peak_kib']:>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
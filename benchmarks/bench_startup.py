@@ -0,0 +1,143 @@
+"""
+Startup benchmark: how long the plugin adds to calibre's launch, to the first search and to opening its settings.
+
+calibre imports the store and creates it for every launch, the core is only set up for the first search and the
+settings widget is created every time the settings are opened. Every measurement is repeated with the plugin's modules
+removed from sys.modules in between, the median is reported in milliseconds.
+Modules that calibre itself has already imported, like Qt and lxml, don't count, just like at a real launch.
+
+With calibre all of it is measured: calibre-debug -e benchmarks/bench_startup.py
+Without calibre only the core is: python benchmarks/bench_startup.py
+Options can be passed in the BENCH_ARGS environment variable as well.
+"""
+import argparse
+import json
+import os
+import shlex
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import plugin  # noqa: E402
+
+plugin.load()
+
+PACKAGE = 'calibre_plugins.store_annas_archive'
+
+
+def unload():
+    for name in list(sys.modules):
+        if name.startswith(PACKAGE + '.'):
+            del sys.modules[name]
+
+
+def measure(setup, repeat: int) -> float:
+    """
+    Median time of calling setup with a freshly imported plugin, in milliseconds.
+    """
+    times = []
+    for _ in range(repeat):
+        unload()
+        start = time.perf_counter()
+        setup()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def cold_import(module: str, repeat: int) -> float:
+    """
+    Median time of importing a module in a new interpreter, where nothing has been imported yet, in milliseconds.
+    """
+    code = (f'import sys, time; sys.path.insert(0, {plugin.ROOT + "/benchmarks"!r}); import plugin; plugin.load(); '
+            f'start = time.perf_counter(); import {module}; print((time.perf_counter() - start) * 1000)')
+    return statistics.median(
+        float(subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout)
+        for _ in range(repeat)
+    )
+
+
+def bench_core(repeat: int) -> dict:
+    def construct():
+        from calibre_plugins.store_annas_archive.core import AnnasArchive
+        AnnasArchive({})
+
+    results = {'core_import_and_init': measure(construct, repeat)}
+    # calibre's own executable can't run python -c
+    if not getattr(sys, 'frozen', False):
+        results['core_import_cold'] = cold_import(PACKAGE + '.core', repeat)
+    return results
+
+
+def bench_calibre(repeat: int) -> dict:
+    from calibre.gui2 import Application
+    from qt.core import QTabWidget
+
+    app = Application([])  # noqa: F841, the widgets need it
+    config = {'cache': {'enabled': False}}
+    results = {}
+
+    def launch():
+        from calibre_plugins.store_annas_archive.annas_archive import AnnasArchiveStore
+        return AnnasArchiveStore(None, 'Anna\'s Archive', config=config)
+
+    results['launch'] = measure(launch, repeat)
+
+    def first_search():
+        launch().core
+
+    results['launch_and_first_search_setup'] = measure(first_search, repeat)
+
+    widgets = []
+
+    def open_settings():
+        widgets.append(launch().config_widget())
+
+    results['launch_and_open_settings'] = measure(open_settings, repeat)
+
+    def open_performance_tab():
+        widget = launch().config_widget()
+        widget.findChild(QTabWidget).setCurrentIndex(1)
+        widgets.append(widget)
+
+    results['launch_and_open_performance_tab'] = measure(open_performance_tab, repeat)
+    for widget in widgets:
+        widget.deleteLater()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--output', default='bench_startup.json', help='File to write the results to')
+    parser.add_argument('--compare', help='Results of a previous run to compare with')
+    args = parser.parse_args(shlex.split(os.environ.get('BENCH_ARGS', '')) or sys.argv[1:])
+
+    results = bench_core(args.repeat)
+    try:
+        import calibre.gui2  # noqa: F401
+    except ImportError:
+        print('calibre isn\'t available, only the core is measured', file=sys.stderr)
+    else:
+        results.update(bench_calibre(args.repeat))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+
+    if previous is not None:
+        print(f"{'measurement':<34} {'before':>10} {'after':>10} {'change':>8}")
+        for name, value in results.items():
+            old = previous.get(name)
+            if old:
+                print(f'{name:<34} {old:>10.1f} {value:>10.1f} {(value - old) / old:>+8.1%}')
+
+
+if __name__ == '__main__':
+    main()
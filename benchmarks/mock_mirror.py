@@ -0,0 +1,177 @@
+"""
+In-process stand-in for an Anna's Archive mirror, the libgen, scihub and zlib pages its download links go to
+and the server its covers come from.
+Latency, 5xx responses, hanging requests and slowly streamed bodies can be configured per server.
+"""
+import hashlib
+import os
+import random
+import re
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from urllib.parse import parse_qs, urlsplit
+
+import plugin
+
+DETAIL_PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{md5} - Anna's Archive</title></head><body>
+<div id="md5-panel-downloads"><ul class="list-inside mb-4 ml-1">{links}</ul></div>
+</body></html>'''
+DETAIL_LINK = '<li class="list-disc"><a href="{href}" class="js-download-link">{text}</a></li>'
+LIBGEN_LI_PAGE = ('<html><body><table><tr><td><a href="get.php?md5={md5}&key=ABC"><h2>GET</h2></a></td></tr></table>'
+                  '</body></html>')
+LIBGEN_RS_PAGE = '<html><body><div id="download"><h2><a href="{base}/files/{md5}.epub">GET</a></h2></div></body></html>'
+SCIHUB_PAGE = ('<html><body><div id="article"><embed type="application/pdf" src="//{host}/files/{md5}.pdf" id="pdf">'
+               '</div></body></html>')
+ZLIB_PAGE = '<html><body><a class="btn btn-primary addDownloadedBook" href="dl/{md5}">Download</a></body></html>'
+
+
+def md5_for(i: int) -> str:
+    return hashlib.md5(str(i).encode()).hexdigest()
+
+
+class MockMirror:
+    """
+    A server on localhost that answers like a mirror of Anna's Archive.
+
+    :param latency: seconds to wait before answering each request
+    :param error_rate: chance of answering a request with a 503
+    :param timeout_rate: chance of never answering a request, until hang seconds have passed
+    :param chunk_delay: seconds to wait between each chunk of chunk_size bytes of a body
+    :param total_results: number of results every search has
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0, timeout_rate: float = 0.0, hang: float = 30.0,
+                 chunk_delay: float = 0.0, chunk_size: int = 16 * 1024, total_results: int = 1000, seed: int = 0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.hang = hang
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.total_results = total_results
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = Lock()
+
+        with open(os.path.join(plugin.FIXTURES, 'search_row.html'), encoding='utf-8') as f:
+            self.row = f.read().strip()
+        with open(os.path.join(plugin.FIXTURES, 'search_page.html'), encoding='utf-8') as f:
+            self.page = f.read()
+
+        mirror = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                mirror.handle(self, body=True)
+
+            def do_HEAD(self):
+                mirror.handle(self, body=False)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.row = self.row.replace('https://s3proxy.cdn-zlib.se', self.url)
+        self._thread = None
+
+    def start(self) -> 'MockMirror':
+        self._thread = Thread(target=self.server.serve_forever, name='MockMirror', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, handler: BaseHTTPRequestHandler, body: bool):
+        with self._lock:
+            self.requests += 1
+            roll = self.random.random()
+        if self.latency:
+            time.sleep(self.latency)
+        if roll < self.timeout_rate:
+            time.sleep(self.hang)
+            handler.close_connection = True
+            return
+        if roll < self.timeout_rate + self.error_rate:
+            self.send(handler, 503, b'Service Unavailable', 'text/plain', body)
+            return
+
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        if url.path == '/search':
+            self.send(handler, 200, self.search_page(int(query.get('page', ['1'])[0])), 'text/html', body)
+        elif match := re.fullmatch(r'/md5/(\w+)', url.path):
+            self.send(handler, 200, self.detail_page(match.group(1)), 'text/html', body)
+        elif url.path == '/libgen.li/ads.php':
+            self.send(handler, 200, LIBGEN_LI_PAGE.format(md5=query['md5'][0]).encode(), 'text/html', body)
+        elif url.path == '/libgen.rs/book/index.php':
+            page = LIBGEN_RS_PAGE.format(base=self.url, md5=query['md5'][0])
+            self.send(handler, 200, page.encode(), 'text/html', body)
+        elif match := re.fullmatch(r'/scihub/(\w+)', url.path):
+            page = SCIHUB_PAGE.format(host=handler.headers.get('Host'), md5=match.group(1))
+            self.send(handler, 200, page.encode(), 'text/html', body)
+        elif match := re.fullmatch(r'/zlib/md5/(\w+)', url.path):
+            self.send(handler, 200, ZLIB_PAGE.format(md5=match.group(1)).encode(), 'text/html', body)
+        elif url.path.startswith('/covers300/'):
+            # A different cover of about 20 KB for every book
+            self.send(handler, 200, b'\xff\xd8' + hashlib.sha1(url.path.encode()).digest() * 1024, 'image/jpeg', body)
+        elif url.path in ('/get.php', '/') or url.path.startswith(('/files/', '/dl/')):
+            self.send(handler, 200, b'\0' * 1024, 'application/octet-stream', body)
+        else:
+            self.send(handler, 404, b'Not Found', 'text/plain', body)
+
+    def send(self, handler: BaseHTTPRequestHandler, status: int, data: bytes, content_type: str, body: bool):
+        try:
+            handler.send_response(status)
+            handler.send_header('Content-Type', content_type)
+            handler.send_header('Content-Length', str(len(data)))
+            handler.end_headers()
+            if not body:
+                return
+            for i in range(0, len(data), self.chunk_size):
+                if self.chunk_delay and i:
+                    time.sleep(self.chunk_delay)
+                handler.wfile.write(data[i:i + self.chunk_size])
+                with self._lock:
+                    self.bytes_sent += min(self.chunk_size, len(data) - i)
+        except (BrokenPipeError, ConnectionResetError):
+            handler.close_connection = True
+
+    def search_page(self, page: int) -> bytes:
+        start = (page - 1) * 100
+        rows = ''.join(
+            self.row.replace('{md5}', md5_for(i)).replace('{i}', str(i))
+            for i in range(start, min(start + 100, self.total_results))
+        )
+        return self.page.replace('{rows}', rows).encode('utf-8')
+
+    def detail_page(self, md5: str) -> bytes:
+        links = (
+            ('Libgen.li', f'{self.url}/libgen.li/ads.php?md5={md5}'),
+            ('Libgen.rs Fiction', f'{self.url}/libgen.rs/book/index.php?md5={md5}'),
+            ('Sci-Hub: 10.1000/example', f'{self.url}/scihub/{md5}'),
+            ('Z-Library', f'{self.url}/zlib/md5/{md5}'),
+            ('IPFS Gateway #1', f'{self.url}/ipfs/{md5}'),
+        )
+        return DETAIL_PAGE.format(md5=md5, links=''.join(
+            DETAIL_LINK.format(href=href, text=text) for text, href in links
+        )).encode('utf-8')
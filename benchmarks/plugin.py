@@ -0,0 +1,21 @@
+"""
+Makes the plugin importable as calibre_plugins.store_annas_archive, the way calibre loads it, without installing it.
+"""
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'benchmarks', 'fixtures')
+
+
+def load():
+    if 'calibre_plugins.store_annas_archive' in sys.modules:
+        return
+    namespace = sys.modules.setdefault('calibre_plugins', types.ModuleType('calibre_plugins'))
+    if not hasattr(namespace, '__path__'):
+        namespace.__path__ = []
+    package = types.ModuleType('calibre_plugins.store_annas_archive')
+    package.__path__ = [ROOT]
+    sys.modules[package.__name__] = package
+    namespace.store_annas_archive = package
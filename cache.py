@@ -0,0 +1,89 @@
+import json
+import os
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Any, Optional
+
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('Cache',)
+
+
+class Cache:
+    """
+    Persistent key-value cache backed by SQLite.
+    Values are stored as JSON, every entry has its own expiry time and the least recently used entries are evicted
+    once the stored values take up more than max_size bytes.
+    Hits and misses are counted per key prefix, the part of the key before the first ':'.
+    """
+
+    def __init__(self, path: str, max_size: int, stats: Optional[Stats] = None):
+        self.path = path
+        self.max_size = max_size
+        self.stats = stats
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, '
+                'expires REAL NOT NULL, accessed REAL NOT NULL)'
+            )
+            self._conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        now = time()
+        with self._lock:
+            row = self.conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[1] <= now:
+                self.conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+                row = None
+            if row is not None:
+                self.conn.execute('UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        if self.stats is not None:
+            self.stats.count(f"cache.{key.split(':', 1)[0]}.{'miss' if row is None else 'hit'}")
+        return None if row is None else json.loads(row[0])
+
+    def set(self, key: str, value: Any, ttl: float):
+        value = json.dumps(value, separators=(',', ':'))
+        now = time()
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO cache (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)',
+                (key, value, len(value), now + ttl, now)
+            )
+            self._evict(now)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.conn.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM cache')
+            self.conn.execute('VACUUM')
+
+    def size(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+
+    def _evict(self, now: float):
+        self.conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        excess = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0] - self.max_size
+        if excess <= 0:
+            return
+        keys = []
+        for key, size in self.conn.execute('SELECT key, size FROM cache ORDER BY accessed'):
+            keys.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        self.conn.executemany('DELETE FROM cache WHERE key = ?', keys)
@@ -0,0 +1,102 @@
+"""
+Search Anna's Archive and resolve download links from the command line, without calibre's GUI.
+Every result is printed as a JSON object on its own line.
+
+    calibre-debug -r "Anna's Archive" -- search "the hobbit" --details
+    python cli.py search "the hobbit" 9780261103344 --max-results 5
+    python cli.py details 0123456789abcdef0123456789abcdef --format epub
+"""
+import argparse
+import json
+import os
+import sys
+import types
+
+if __name__ == '__main__' and 'calibre_plugins.store_annas_archive' not in sys.modules:
+    # Running from a checkout, make the plugin importable the way calibre loads it
+    _namespace = sys.modules.setdefault('calibre_plugins', types.ModuleType('calibre_plugins'))
+    if not hasattr(_namespace, '__path__'):
+        _namespace.__path__ = []
+    _package = types.ModuleType('calibre_plugins.store_annas_archive')
+    _package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules[_package.__name__] = _package
+    _namespace.store_annas_archive = _package
+
+from calibre_plugins.store_annas_archive.core import AnnasArchive  # noqa: E402
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='store_annas_archive', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--timeout', type=float, default=60, help='Seconds for each search or lookup')
+    parser.add_argument('--mirror', action='append', help='Mirror to use instead of the configured ones, repeatable')
+    parser.add_argument('--cache', help='SQLite file to cache pages and links in')
+    parser.add_argument('--no-cache', action='store_true', help='Don\'t use the cache')
+    parser.add_argument('--index', help='SQLite file for the index of seen results')
+    parser.add_argument('--no-index', action='store_true', help='Don\'t use the index of seen results')
+    parser.add_argument('--stats', action='store_true', help='Print the timings and counters to stderr at the end')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    search = commands.add_parser('search', help='Search for one or more queries')
+    search.add_argument('queries', nargs='+')
+    search.add_argument('--max-results', type=int, default=10, help='Results per query')
+    search.add_argument('--details', action='store_true', help='Resolve the download links of every result')
+
+    details = commands.add_parser('details', help='Resolve the download links of a book')
+    details.add_argument('md5')
+    details.add_argument('--format', required=True, help='Format of the book, e.g. epub')
+    return parser
+
+
+def _print(obj: dict):
+    print(json.dumps(obj, ensure_ascii=False), flush=True)
+
+
+def main(args=None, config=None, cache_path=None, index_path=None) -> int:
+    """
+    Run the command line with the plugin's config, cache and index if they are given,
+    otherwise with the default settings.
+    """
+    opts = _parser().parse_args(args)
+    # A copy, so that options like --mirror aren't saved to the plugin's settings
+    config = dict(config or {})
+    if opts.mirror:
+        config['mirrors'] = opts.mirror
+    if opts.cache:
+        cache_path = opts.cache
+    if opts.no_cache:
+        cache_path = None
+    if opts.index:
+        index_path = opts.index
+    if opts.no_index:
+        index_path = None
+    core = AnnasArchive(config, cache_path, index_path)
+
+    try:
+        if opts.command == 'search':
+            for query, (md5, title, author, formats, cover_url) in core.search_many(
+                    opts.queries, opts.max_results, opts.timeout):
+                result = {'query': query, 'md5': md5, 'title': title, 'author': author, 'formats': formats,
+                          'cover_url': cover_url}
+                if opts.details:
+                    result['downloads'] = core.get_downloads(md5, formats, opts.timeout)
+                _print(result)
+            # search_many logs a failed search and goes on with the others
+            failed = core.stats.counters().get('batch.errors')
+            if failed:
+                print(f'Error: {failed} of the searches failed', file=sys.stderr)
+                return 1
+        else:
+            _print({'md5': opts.md5, 'downloads': core.get_downloads(opts.md5, opts.format, opts.timeout)})
+    except Exception as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 1
+    finally:
+        if opts.stats:
+            print(json.dumps(core.stats.summary(), indent=2), file=sys.stderr)
+        core.session.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,25 +1,46 @@
 from typing import Dict
 
-from calibre_plugins.store_annas_archive.constants import (DEFAULT_MIRRORS, SearchConfiguration, Order, Content, Access,
-                                                           FileType, Source, Language)
+from calibre_plugins.store_annas_archive.constants import (DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL,
+                                                           DEFAULT_CONCURRENT_PAGES, DEFAULT_COVER_CACHE_SIZE,
+                                                           DEFAULT_INDEX_SIZE, DEFAULT_MAX_LINKS, DEFAULT_MIRRORS,
+                                                           DEFAULT_PREFETCH_RESULTS, DEFAULT_RATE_LIMIT,
+                                                           MAX_CONNECTIONS_PER_HOST,
+                                                           SearchConfiguration, Order, Content, Access, FileType,
+                                                           Source, Language)
 
 try:
-    from qt.core import (Qt, QWidget, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QGroupBox, QScrollArea,
-                         QAbstractScrollArea, QComboBox, QCheckBox, QSizePolicy, QListWidget, QListWidgetItem,
-                         QAbstractItemView, QShortcut, QKeySequence)
+    from qt.core import (Qt, QWidget, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QGroupBox, QComboBox, QCheckBox,
+                         QSizePolicy, QListWidget, QListWidgetItem, QAbstractItemView, QShortcut, QKeySequence,
+                         QSpinBox, QPushButton, QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView)
 except (ImportError, ModuleNotFoundError):
     from PyQt5.QtCore import Qt
-    from PyQt5.QtWidgets import (QWidget, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QFrame, QGroupBox, QScrollArea,
-                                 QAbstractScrollArea, QComboBox, QCheckBox, QSizePolicy, QListWidget, QListWidgetItem,
-                                 QAbstractItemView, QShortcut)
+    from PyQt5.QtWidgets import (QWidget, QGridLayout, QVBoxLayout, QHBoxLayout, QLabel, QGroupBox, QComboBox,
+                                 QCheckBox, QSizePolicy, QListWidget, QListWidgetItem, QAbstractItemView, QShortcut,
+                                 QSpinBox, QPushButton, QTabWidget, QTableWidget, QTableWidgetItem, QHeaderView)
     from PyQt5.QtGui import QKeySequence
 
 load_translations()
 
 
+class _CheckableItem:
+    """
+    Gives a checkable QListWidgetItem the interface of a QCheckBox, as used by CheckboxConfiguration.
+    """
+
+    def __init__(self, item: QListWidgetItem):
+        self.item = item
+
+    def isChecked(self) -> bool:
+        return self.item.checkState() == Qt.CheckState.Checked
+
+    def setChecked(self, checked: bool):
+        self.item.setCheckState(Qt.CheckState.Checked if checked else Qt.CheckState.Unchecked)
+
+
 class MirrorsList(QListWidget):
     def __init__(self, parent=...):
         super().__init__(parent)
+        self.health = None
         self.setDragEnabled(True)
         self.setDragDropMode(QAbstractItemView.DragDropMode.InternalMove)
 
@@ -33,11 +54,16 @@ class MirrorsList(QListWidget):
         if self.currentRow() != self.count() - 1:
             self.takeItem(self.currentRow())
 
-    def load_mirrors(self, mirrors):
+    def load_mirrors(self, mirrors, health=None):
+        self.health = health
         self._check_last_changed = False
         for mirror in mirrors:
             item = QListWidgetItem(mirror, self)
             item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
+            item.setToolTip(self.describe(mirror))
+            if health is not None and (health.is_open(mirror)
+                                       or ((stats := health.get(mirror)) and stats['error_rate'] > 0.5)):
+                item.setForeground(Qt.GlobalColor.red)
         self._add_last_list_item()
         self._check_last_changed = True
 
@@ -58,6 +84,16 @@ class MirrorsList(QListWidget):
                 self._add_last_list_item()
                 self._check_last_changed = True
 
+    def describe(self, mirror: str) -> str:
+        stats = self.health.get(mirror) if self.health is not None and mirror else None
+        if stats is None:
+            return _('No measurements yet')
+        text = _('Latency: {latency:.0f} ms, errors: {error_rate:.0%}').format(
+            latency=stats['latency'] * 1000, error_rate=stats['error_rate'])
+        if self.health.is_open(mirror):
+            text += ', ' + _('skipped after repeated failures')
+        return text
+
     def get_mirrors(self) -> list:
         return [
             item for i in range(self.count())
@@ -71,9 +107,13 @@ class ConfigWidget(QWidget):
         self.store = store
         self.resize(635, 780)
 
-        main_layout = QVBoxLayout(self)
+        tabs = QTabWidget(self)
+        QVBoxLayout(self).addWidget(tabs)
 
-        search_options = QGroupBox(_('Search options'), self)
+        settings = QWidget(tabs)
+        main_layout = QVBoxLayout(settings)
+
+        search_options = QGroupBox(_('Search options'), settings)
         search_options.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Preferred)
         search_grid = QGridLayout(search_options)
         search_grid.setContentsMargins(3, 3, 3, 3)
@@ -95,13 +135,13 @@ class ConfigWidget(QWidget):
         search_grid.addWidget(self._make_cbx_group(search_options, FileType()), 2, 0)
         search_grid.addWidget(self._make_cbx_group(search_options, Access()), 1, 1)
         search_grid.addWidget(self._make_cbx_group(search_options, Source()), 2, 1)
-        search_grid.addWidget(self._make_cbx_group(search_options, Language(), scrollbar=True), 1, 2, 2, 1)
+        search_grid.addWidget(self._make_list_group(search_options, Language()), 1, 2, 2, 1)
 
         main_layout.addWidget(search_options)
 
         horizontal_layout = QHBoxLayout()
 
-        link_options = QGroupBox(_('Download link options'), self)
+        link_options = QGroupBox(_('Download link options'), settings)
         link_options.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
         link_layout = QVBoxLayout(link_options)
         link_layout.setContentsMargins(6, 6, 6, 6)
@@ -110,64 +150,268 @@ class ConfigWidget(QWidget):
         link_layout.addWidget(self.url_extension)
         self.content_type = QCheckBox(_('Verify Content-Type'), link_options)
         self.content_type.setToolTip(_(
-            'Get the header of each site and verify that it has an \'application\' content type'))
+            'Get the header of each site in the background and verify that it has an \'application\' content type.\n'
+            'Links are shown as unverified until they are checked, links that fail the check are removed'))
         link_layout.addWidget(self.content_type)
+        max_links_layout = QHBoxLayout()
+        max_links_layout.addWidget(QLabel(_('Stop after:'), link_options))
+        self.max_links = QSpinBox(link_options)
+        self.max_links.setRange(0, 20)
+        self.max_links.setSuffix(_(' working links'))
+        self.max_links.setSpecialValueText(_('All links'))
+        self.max_links.setToolTip(_('Resolve the fastest and most reliable download sources first '
+                                    'and stop once this many links have been found'))
+        max_links_layout.addWidget(self.max_links, 1)
+        link_layout.addLayout(max_links_layout)
+        link_layout.addStretch()
         horizontal_layout.addWidget(link_options)
 
-        mirrors = QGroupBox(_('Mirrors'), self)
+        network_options = QGroupBox(_('Network options'), settings)
+        network_options.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Preferred)
+        network_grid = QGridLayout(network_options)
+        network_grid.setContentsMargins(6, 6, 6, 6)
+        concurrent_pages_label = QLabel(_('Concurrent pages:'), network_options)
+        concurrent_pages_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(concurrent_pages_label, 0, 0)
+        self.concurrent_pages = QSpinBox(network_options)
+        self.concurrent_pages.setRange(1, MAX_CONNECTIONS_PER_HOST)
+        self.concurrent_pages.setToolTip(_('How many result pages are requested at the same time'))
+        network_grid.addWidget(self.concurrent_pages, 0, 1)
+        rate_limit_label = QLabel(_('Requests per second:'), network_options)
+        rate_limit_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(rate_limit_label, 1, 0)
+        self.rate_limit = QSpinBox(network_options)
+        self.rate_limit.setRange(0, 100)
+        self.rate_limit.setSpecialValueText(_('Unlimited'))
+        self.rate_limit.setToolTip(_('The most requests sent to the mirrors per second, for all searches together'))
+        network_grid.addWidget(self.rate_limit, 1, 1)
+        prefetch_label = QLabel(_('Prefetch links of the top:'), network_options)
+        prefetch_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(prefetch_label, 2, 0)
+        self.prefetch = QSpinBox(network_options)
+        self.prefetch.setRange(0, 20)
+        self.prefetch.setSuffix(_(' results'))
+        self.prefetch.setSpecialValueText(_('Off'))
+        self.prefetch.setToolTip(_('Look up the download links of the first results in the background after a search, '
+                                   'so they are ready when a result is opened'))
+        network_grid.addWidget(self.prefetch, 2, 1)
+
+        self.cache_enabled = QCheckBox(_('Cache search results'), network_options)
+        self.cache_enabled.setToolTip(_('Keep the results of recent searches on disk so repeated searches are instant'))
+        network_grid.addWidget(self.cache_enabled, 3, 0, 1, 2)
+        cache_ttl_label = QLabel(_('Keep results for:'), network_options)
+        cache_ttl_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(cache_ttl_label, 4, 0)
+        self.cache_ttl = QSpinBox(network_options)
+        self.cache_ttl.setRange(1, 24 * 30)
+        self.cache_ttl.setSuffix(_(' hours'))
+        network_grid.addWidget(self.cache_ttl, 4, 1)
+        cache_size_label = QLabel(_('Maximum cache size:'), network_options)
+        cache_size_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(cache_size_label, 5, 0)
+        self.cache_size = QSpinBox(network_options)
+        self.cache_size.setRange(1, 1024)
+        self.cache_size.setSuffix(_(' MiB'))
+        network_grid.addWidget(self.cache_size, 5, 1)
+        self.cache_enabled.toggled.connect(self.cache_ttl.setEnabled)
+        self.cache_enabled.toggled.connect(self.cache_size.setEnabled)
+
+        self.index_enabled = QCheckBox(_('Show previously seen results first'), network_options)
+        self.index_enabled.setToolTip(_('Search the results of earlier searches on disk, they are shown instantly '
+                                        'and even when the mirrors are down'))
+        network_grid.addWidget(self.index_enabled, 6, 0, 1, 2)
+        index_size_label = QLabel(_('Remember up to:'), network_options)
+        index_size_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(index_size_label, 7, 0)
+        self.index_size = QSpinBox(network_options)
+        self.index_size.setRange(100, 1000000)
+        self.index_size.setSingleStep(1000)
+        self.index_size.setSuffix(_(' results'))
+        network_grid.addWidget(self.index_size, 7, 1)
+        self.index_enabled.toggled.connect(self.index_size.setEnabled)
+
+        self.covers_enabled = QCheckBox(_('Cache covers'), network_options)
+        self.covers_enabled.setToolTip(_('Download the covers of the results together and keep them on disk, '
+                                         'so they don\'t have to be downloaded again'))
+        network_grid.addWidget(self.covers_enabled, 8, 0, 1, 2)
+        self.covers_thumbnails = QCheckBox(_('Store covers as thumbnails'), network_options)
+        self.covers_thumbnails.setToolTip(_('Downscale the covers to the size they are shown at, to save disk space'))
+        network_grid.addWidget(self.covers_thumbnails, 9, 0, 1, 2)
+        covers_size_label = QLabel(_('Maximum cover cache size:'), network_options)
+        covers_size_label.setAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+        network_grid.addWidget(covers_size_label, 10, 0)
+        self.covers_size = QSpinBox(network_options)
+        self.covers_size.setRange(1, 4096)
+        self.covers_size.setSuffix(_(' MiB'))
+        network_grid.addWidget(self.covers_size, 10, 1)
+        self.covers_enabled.toggled.connect(self.covers_thumbnails.setEnabled)
+        self.covers_enabled.toggled.connect(self.covers_size.setEnabled)
+        clear_cache = QPushButton(_('Clear cache'), network_options)
+        clear_cache.setToolTip(_('Remove the cached search results, covers and previously seen results'))
+        clear_cache.clicked.connect(self.clear_cache)
+        network_grid.addWidget(clear_cache, 11, 1)
+        horizontal_layout.addWidget(network_options)
+
+        mirrors = QGroupBox(_('Mirrors'), settings)
         layout = QVBoxLayout(mirrors)
         layout.setContentsMargins(1, 1, 1, 1)
         self.mirrors = MirrorsList(mirrors)
         layout.addWidget(self.mirrors)
+        self.mirror_health = QLabel(mirrors)
+        layout.addWidget(self.mirror_health)
+        self.mirrors.currentItemChanged.connect(
+            lambda item: self.mirror_health.setText(self.mirrors.describe(item.text()) if item else ''))
         horizontal_layout.addWidget(mirrors)
 
         main_layout.addLayout(horizontal_layout)
 
-        self.open_external = QCheckBox(_('Open store in external web browser'), self)
-        main_layout.addWidget(self.open_external)
+        bottom_layout = QHBoxLayout()
+        self.open_external = QCheckBox(_('Open store in external web browser'), settings)
+        bottom_layout.addWidget(self.open_external)
+        bottom_layout.addStretch()
+        batch_search = QPushButton(_('Batch search...'), settings)
+        batch_search.setToolTip(_('Search for many books at once'))
+        batch_search.clicked.connect(self.batch_search)
+        bottom_layout.addWidget(batch_search)
+        main_layout.addLayout(bottom_layout)
+        tabs.addTab(settings, _('Settings'))
+
+        # Built when it is first shown, most of the time it isn't
+        self.timings = self.counters = self.debug_log = None
+        self._performance = QWidget(tabs)
+        tabs.addTab(self._performance, _('Performance'))
+        tabs.currentChanged.connect(lambda index: self._make_performance_tab() if index == 1 else None)
 
         self.load_settings()
 
-    def _make_cbx_group(self, parent, option: SearchConfiguration, scrollbar: bool = False):
+    def _make_cbx_group(self, parent, option: SearchConfiguration):
         box = QGroupBox(_(option.name), parent)
         vertical_layout = QVBoxLayout(box)
-        if scrollbar:
-            vertical_layout.setSpacing(0)
-            vertical_layout.setContentsMargins(0, 0, 0, 0)
-
-            scroll_area = QScrollArea(box)
-            scroll_area.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Preferred)
-            scroll_area.setFrameShape(QFrame.Shape.NoFrame)
-            scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-            scroll_area.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-            scroll_area.setSizeAdjustPolicy(QAbstractScrollArea.SizeAdjustPolicy.AdjustToContents)
-
-            cbx_parent = QWidget()
-            cbx_parent.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Preferred)
-            top_vertical = vertical_layout
-            vertical_layout = QVBoxLayout(cbx_parent)
-        else:
-            cbx_parent = box
-
         vertical_layout.setSpacing(3)
         vertical_layout.setContentsMargins(3, 3, 3, 3)
 
         for name, type_ in option.options:
-            check_box = QCheckBox(cbx_parent)
+            check_box = QCheckBox(box)
             check_box.setText(name)
             vertical_layout.addWidget(check_box)
             option.checkboxes[type_] = check_box
         self.search_options[option.config_option] = option
-        if scrollbar:
-            scroll_area.setWidget(cbx_parent)
-            top_vertical.addWidget(scroll_area)
         return box
 
+    def _make_list_group(self, parent, option: SearchConfiguration):
+        """
+        Like _make_cbx_group, but with a checkable item in a single list instead of a widget for every value,
+        for options with many values.
+        """
+        box = QGroupBox(_(option.name), parent)
+        vertical_layout = QVBoxLayout(box)
+        vertical_layout.setSpacing(0)
+        vertical_layout.setContentsMargins(0, 0, 0, 0)
+
+        list_widget = QListWidget(box)
+        list_widget.setUniformItemSizes(True)
+        list_widget.setSizePolicy(QSizePolicy.Policy.Fixed, QSizePolicy.Policy.Preferred)
+        for name, type_ in option.options:
+            item = QListWidgetItem(name, list_widget)
+            item.setFlags(Qt.ItemFlag.ItemIsUserCheckable | Qt.ItemFlag.ItemIsEnabled)
+            item.setCheckState(Qt.CheckState.Unchecked)
+            option.checkboxes[type_] = _CheckableItem(item)
+        list_widget.setFixedWidth(list_widget.sizeHintForColumn(0) + list_widget.verticalScrollBar().sizeHint().width()
+                                  + 2 * list_widget.frameWidth())
+        vertical_layout.addWidget(list_widget)
+        self.search_options[option.config_option] = option
+        return box
+
+    def _make_performance_tab(self):
+        if self.timings is not None:
+            return
+        performance = self._performance
+        layout = QVBoxLayout(performance)
+
+        self.timings = QTableWidget(0, 6, performance)
+        self.timings.setHorizontalHeaderLabels(
+            [_('Stage'), _('Mirror / host'), _('Count'), _('Mean (ms)'), _('p50 (ms)'), _('p95 (ms)')])
+        self.timings.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.timings.verticalHeader().setVisible(False)
+        self.timings.horizontalHeader().setSectionResizeMode(1, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.timings, 3)
+
+        self.counters = QTableWidget(0, 2, performance)
+        self.counters.setHorizontalHeaderLabels([_('Counter'), _('Value')])
+        self.counters.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.counters.verticalHeader().setVisible(False)
+        self.counters.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        layout.addWidget(self.counters, 2)
+
+        self.debug_log = QCheckBox(_('Write timings to the calibre debug log'), performance)
+        layout.addWidget(self.debug_log)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        refresh = QPushButton(_('Refresh'), performance)
+        refresh.clicked.connect(self.load_stats)
+        buttons.addWidget(refresh)
+        reset = QPushButton(_('Reset'), performance)
+        reset.clicked.connect(self.reset_stats)
+        buttons.addWidget(reset)
+        layout.addLayout(buttons)
+
+        self.debug_log.setChecked(self.store.config.get('debug_log', False))
+        self.load_stats()
+
+    def load_stats(self):
+        core = self.store.loaded_core
+        if core is None:
+            # Nothing has been searched yet
+            self.timings.setRowCount(0)
+            self.counters.setRowCount(0)
+            return
+        timings = sorted(core.stats.timings().items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        self.timings.setRowCount(len(timings))
+        for row, ((stage, label), values) in enumerate(timings):
+            cells = (stage, label or '', str(values['count']),
+                     *(f"{values[key] * 1000:.0f}" for key in ('mean', 'p50', 'p95')))
+            for column, text in enumerate(cells):
+                self.timings.setItem(row, column, QTableWidgetItem(text))
+
+        counters = sorted(core.stats.counters().items())
+        self.counters.setRowCount(len(counters))
+        for row, (name, value) in enumerate(counters):
+            self.counters.setItem(row, 0, QTableWidgetItem(name))
+            self.counters.setItem(row, 1, QTableWidgetItem(str(value)))
+
+    def reset_stats(self):
+        if self.store.loaded_core is not None:
+            self.store.loaded_core.stats.reset()
+        self.load_stats()
+
+    def clear_cache(self):
+        if self.store.core.cache is not None:
+            self.store.core.cache.clear()
+        if self.store.core.index is not None:
+            self.store.core.index.clear()
+        if self.store.core.covers is not None:
+            self.store.core.covers.clear()
+        self.store.core.prefetcher.clear()
+        self.store.core.cover_prefetcher.clear()
+        self.store.core.verifier.clear()
+
+    def batch_search(self):
+        from calibre_plugins.store_annas_archive.batch import BatchSearchDialog
+        BatchSearchDialog(self.store, self).exec()
+
     def load_settings(self):
         config = self.store.config
 
         self.open_external.setChecked(config.get('open_external', False))
-        self.mirrors.load_mirrors(config.get('mirrors', DEFAULT_MIRRORS))
+        core = self.store.loaded_core
+        if core is not None:
+            health = core.mirror_health
+        else:
+            # The saved scores are enough, setting up the core would make opening the settings slow
+            from calibre_plugins.store_annas_archive.mirrors import MirrorHealth
+            health = MirrorHealth(config, None)
+        self.mirrors.load_mirrors(config.get('mirrors', DEFAULT_MIRRORS), health)
 
         search_opts = config.get('search', {})
         for configuration in self.search_options.values():
@@ -176,6 +420,34 @@ class ConfigWidget(QWidget):
         link_opts = config.get('link', {})
         self.url_extension.setChecked(link_opts.get('url_extension', True))
         self.content_type.setChecked(link_opts.get('content_type', False))
+        self.max_links.setValue(link_opts.get('max_links', DEFAULT_MAX_LINKS))
+
+        self.concurrent_pages.setValue(config.get('concurrent_pages', DEFAULT_CONCURRENT_PAGES))
+        self.rate_limit.setValue(config.get('rate_limit', DEFAULT_RATE_LIMIT))
+        self.prefetch.setValue(config.get('prefetch', DEFAULT_PREFETCH_RESULTS))
+
+        cache_opts = config.get('cache', {})
+        self.cache_enabled.setChecked(cache_opts.get('enabled', True))
+        self.cache_ttl.setValue(cache_opts.get('ttl', DEFAULT_CACHE_TTL))
+        self.cache_size.setValue(cache_opts.get('max_size', DEFAULT_CACHE_SIZE))
+        self.cache_ttl.setEnabled(self.cache_enabled.isChecked())
+        self.cache_size.setEnabled(self.cache_enabled.isChecked())
+
+        index_opts = config.get('index', {})
+        self.index_enabled.setChecked(index_opts.get('enabled', True))
+        self.index_size.setValue(index_opts.get('max_entries', DEFAULT_INDEX_SIZE))
+        self.index_size.setEnabled(self.index_enabled.isChecked())
+
+        cover_opts = config.get('covers', {})
+        self.covers_enabled.setChecked(cover_opts.get('enabled', True))
+        self.covers_thumbnails.setChecked(cover_opts.get('thumbnails', True))
+        self.covers_size.setValue(cover_opts.get('max_size', DEFAULT_COVER_CACHE_SIZE))
+        self.covers_thumbnails.setEnabled(self.covers_enabled.isChecked())
+        self.covers_size.setEnabled(self.covers_enabled.isChecked())
+
+        if self.debug_log is not None:
+            self.debug_log.setChecked(config.get('debug_log', False))
+            self.load_stats()
 
     def save_settings(self):
         self.store.config['open_external'] = self.open_external.isChecked()
@@ -187,5 +459,25 @@ class ConfigWidget(QWidget):
         }
         self.store.config['link'] = {
             'url_extension': self.url_extension.isChecked(),
-            'content_type': self.content_type.isChecked()
+            'content_type': self.content_type.isChecked(),
+            'max_links': self.max_links.value()
+        }
+        self.store.config['concurrent_pages'] = self.concurrent_pages.value()
+        self.store.config['rate_limit'] = self.rate_limit.value()
+        self.store.config['prefetch'] = self.prefetch.value()
+        self.store.config['cache'] = {
+            'enabled': self.cache_enabled.isChecked(),
+            'ttl': self.cache_ttl.value(),
+            'max_size': self.cache_size.value()
+        }
+        self.store.config['index'] = {
+            'enabled': self.index_enabled.isChecked(),
+            'max_entries': self.index_size.value()
+        }
+        self.store.config['covers'] = {
+            'enabled': self.covers_enabled.isChecked(),
+            'thumbnails': self.covers_thumbnails.isChecked(),
+            'max_size': self.covers_size.value()
         }
+        if self.debug_log is not None:
+            self.store.config['debug_log'] = self.debug_log.isChecked()
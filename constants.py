@@ -5,12 +5,62 @@ if TYPE_CHECKING:
     from qt.core import QCheckBox, QComboBox
 
 __all__ = (
-    'DEFAULT_MIRRORS', 'SearchOption', 'SearchConfiguration', 'CheckboxConfiguration', 'Order', 'Content', 'Access',
-    'FileType', 'Source', 'Language'
+    'DEFAULT_MIRRORS', 'RESULTS_PER_PAGE', 'DEFAULT_CONCURRENT_PAGES', 'DETAILS_WORKERS', 'MAX_CONNECTIONS_PER_HOST',
+    'DEFAULT_CACHE_TTL', 'DEFAULT_CACHE_SIZE', 'DETAILS_CACHE_TTL', 'LINK_CACHE_TTL', 'DEFAULT_RATE_LIMIT',
+    'RATE_LIMIT_BURST', 'BATCH_WORKERS', 'DEFAULT_INDEX_SIZE', 'INDEX_BATCH_SIZE', 'DEFAULT_PREFETCH_RESULTS',
+    'PREFETCH_WORKERS', 'PREFETCH_TTL', 'PREFETCH_TIMEOUT', 'PREFETCH_BUDGET', 'PREFETCH_RATE', 'COVER_WORKERS',
+    'COVER_TIMEOUT', 'DEFAULT_COVER_CACHE_SIZE', 'COVER_THUMBNAIL_SIZE', 'DEFAULT_MAX_LINKS', 'VERIFY_WORKERS',
+    'VERIFY_TIMEOUT', 'VERDICT_CACHE_TTL', 'UNVERIFIED', 'SearchOption', 'SearchConfiguration', 'CheckboxConfiguration',
+    'Order', 'Content', 'Access', 'FileType', 'Source', 'Language'
 )
 
 DEFAULT_MIRRORS = ['https://annas-archive.org', 'https://annas-archive.li', 'https://annas-archive.se']
 RESULTS_PER_PAGE = 100
+DEFAULT_CONCURRENT_PAGES = 4
+DETAILS_WORKERS = 8
+MAX_CONNECTIONS_PER_HOST = 6
+# In hours
+DEFAULT_CACHE_TTL = 12
+# In MiB
+DEFAULT_CACHE_SIZE = 50
+# In seconds
+DETAILS_CACHE_TTL = 7 * 24 * 60 * 60
+LINK_CACHE_TTL = 6 * 60 * 60
+# Working download links after which the other sources of a book aren't resolved anymore
+DEFAULT_MAX_LINKS = 3
+# Download links checked at the same time in the background
+VERIFY_WORKERS = 4
+# In seconds
+VERIFY_TIMEOUT = 15
+VERDICT_CACHE_TTL = 6 * 60 * 60
+# Added to the name of a download link that hasn't been checked yet
+UNVERIFIED = ' (unverified)'
+# Requests per second to the mirrors
+DEFAULT_RATE_LIMIT = 5
+RATE_LIMIT_BURST = 10
+# Queries searched at the same time by search_many
+BATCH_WORKERS = 4
+# Results kept in the index of seen results
+DEFAULT_INDEX_SIZE = 50000
+# Results added to the index at a time while a page is read
+INDEX_BATCH_SIZE = 20
+# Results whose download links are looked up in the background after a search
+DEFAULT_PREFETCH_RESULTS = 3
+PREFETCH_WORKERS = 2
+# In seconds
+PREFETCH_TTL = 10 * 60
+PREFETCH_TIMEOUT = 30
+# Requests all prefetches together may send: bursts of up to PREFETCH_BUDGET, PREFETCH_RATE per second on average
+PREFETCH_BUDGET = 20
+PREFETCH_RATE = 0.5
+# Covers downloaded at the same time during a search
+COVER_WORKERS = 6
+# In seconds
+COVER_TIMEOUT = 10
+# In MiB
+DEFAULT_COVER_CACHE_SIZE = 100
+# In pixels, covers are downscaled to fit in a square of this size
+COVER_THUMBNAIL_SIZE = 256
 
 
 class SearchOption(type):
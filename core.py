@@ -0,0 +1,704 @@
+import sys
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from contextlib import closing
+from functools import partial
+from http.client import HTTPException
+from math import ceil
+from queue import Queue
+from threading import Event, Thread
+from time import monotonic
+from typing import Callable, Dict, Generator, Iterable, List, Optional, Set, Tuple
+from urllib.error import HTTPError
+from urllib.parse import quote_plus, urlsplit
+
+from calibre_plugins.store_annas_archive.cache import Cache
+from calibre_plugins.store_annas_archive.constants import (BATCH_WORKERS, COVER_THUMBNAIL_SIZE, COVER_TIMEOUT,
+                                                           COVER_WORKERS, DEFAULT_CACHE_SIZE, DEFAULT_CACHE_TTL,
+                                                           DEFAULT_CONCURRENT_PAGES, DEFAULT_COVER_CACHE_SIZE,
+                                                           DEFAULT_INDEX_SIZE, DEFAULT_MAX_LINKS, DEFAULT_MIRRORS,
+                                                           DEFAULT_PREFETCH_RESULTS, DEFAULT_RATE_LIMIT,
+                                                           DETAILS_CACHE_TTL, DETAILS_WORKERS, INDEX_BATCH_SIZE,
+                                                           LINK_CACHE_TTL, MAX_CONNECTIONS_PER_HOST, PREFETCH_BUDGET,
+                                                           PREFETCH_RATE, PREFETCH_TIMEOUT, PREFETCH_TTL,
+                                                           PREFETCH_WORKERS, RATE_LIMIT_BURST, RESULTS_PER_PAGE,
+                                                           UNVERIFIED, VERDICT_CACHE_TTL, VERIFY_TIMEOUT,
+                                                           VERIFY_WORKERS, SearchOption)
+from calibre_plugins.store_annas_archive.covers import CoverCache, scale_cover
+from calibre_plugins.store_annas_archive.deadline import Deadline, DeadlineExceeded
+from calibre_plugins.store_annas_archive.index import ResultIndex
+from calibre_plugins.store_annas_archive.limits import TokenBucket
+from calibre_plugins.store_annas_archive.mirrors import MirrorHealth
+from calibre_plugins.store_annas_archive.prefetch import Prefetcher
+from calibre_plugins.store_annas_archive.resolvers import Resolver, Resolvers
+from calibre_plugins.store_annas_archive.results import Row, parse_rows
+from calibre_plugins.store_annas_archive.session import PoolTimeout, Session
+from calibre_plugins.store_annas_archive.stats import Stats, TimedIterator
+from calibre_plugins.store_annas_archive.verify import LinkVerifier, Verdict
+from lxml import html
+
+__all__ = ('AnnasArchive',)
+
+Rows = Generator[Row, None, None]
+BatchRows = Generator[Tuple[str, Row], None, None]
+RowsWithCovers = Generator[Tuple[Row, Optional[bytes]], None, None]
+
+
+def _print_error(message: str):
+    print(message, file=sys.stderr)
+
+
+class AnnasArchive:
+    """
+    Searching Anna's Archive and resolving download links, without anything from calibre's GUI.
+    It only needs the HTTP session and lxml, so it can run headless, e.g. from the command line or a benchmark.
+
+    :param config: the plugin settings, a dict or calibre's JSONConfig
+    :param cache_path: SQLite file to cache pages and links in, there is no cache if it is None
+    :param index_path: SQLite file for the index of seen results, there is no index if it is None
+    :param covers_path: directory to cache covers in, covers aren't downloaded by the core if it is None
+    :param log: called with error messages, and with timings if the debug log is turned on
+    """
+
+    def __init__(self, config, cache_path: Optional[str] = None, index_path: Optional[str] = None,
+                 covers_path: Optional[str] = None, log: Callable[[str], None] = _print_error):
+        self.config = config
+        self.cache_path = cache_path
+        self.index_path = index_path
+        self.covers_path = covers_path
+        self.log = log
+        self.working_mirror = None
+        self.stats = Stats()
+        self.session = Session(MAX_CONNECTIONS_PER_HOST, stats=self.stats)
+        self.mirror_health = MirrorHealth(self.config, self.session)
+        self.resolvers = Resolvers.default(self.config)
+        self.verifier = LinkVerifier(self.session, VERIFY_WORKERS, VERIFY_TIMEOUT, VERDICT_CACHE_TTL, self.stats)
+        # Shared by every search, so a batch search can't flood the mirrors
+        self.rate_limit = TokenBucket(0, RATE_LIMIT_BURST)
+        self.prefetcher = Prefetcher(PREFETCH_WORKERS, PREFETCH_TTL, TokenBucket(PREFETCH_RATE, PREFETCH_BUDGET),
+                                     self.stats)
+        # Covers go to a CDN, not the mirrors, so they don't need a request budget. Their counters are covers.*
+        self.cover_prefetcher = Prefetcher(COVER_WORKERS, PREFETCH_TTL, TokenBucket(0, COVER_WORKERS))
+        self._cache = None
+        self._index = None
+        self._covers = None
+        self.apply_settings()
+
+    def apply_settings(self):
+        """
+        Pick up changes to the settings that are kept outside of the config.
+        """
+        self.stats.log = self.log if self.config.get('debug_log', False) else None
+        self.rate_limit.rate = self.config.get('rate_limit', DEFAULT_RATE_LIMIT)
+        if not self.config.get('prefetch', DEFAULT_PREFETCH_RESULTS):
+            self.prefetcher.cancel()
+
+    @property
+    def cache(self) -> Optional[Cache]:
+        cache_opts = self.config.get('cache', {})
+        if self.cache_path is None or not cache_opts.get('enabled', True):
+            return None
+        if self._cache is None:
+            self._cache = Cache(self.cache_path, 0, self.stats)
+        self._cache.max_size = cache_opts.get('max_size', DEFAULT_CACHE_SIZE) * 1024 * 1024
+        return self._cache
+
+    @property
+    def index(self) -> Optional[ResultIndex]:
+        index_opts = self.config.get('index', {})
+        if self.index_path is None or not index_opts.get('enabled', True):
+            return None
+        if self._index is None:
+            self._index = ResultIndex(self.index_path, 0, self.stats)
+        self._index.max_entries = index_opts.get('max_entries', DEFAULT_INDEX_SIZE)
+        return self._index
+
+    @property
+    def covers(self) -> Optional[CoverCache]:
+        cover_opts = self.config.get('covers', {})
+        if self.covers_path is None or not cover_opts.get('enabled', True):
+            return None
+        if self._covers is None:
+            self._covers = CoverCache(self.covers_path, 0, self.stats)
+        self._covers.max_size = cover_opts.get('max_size', DEFAULT_COVER_CACHE_SIZE) * 1024 * 1024
+        return self._covers
+
+    def _search(self, url: str, max_results: int, timeout: int, prefetch: bool = False,
+                seen: Optional[Set[str]] = None) -> Rows:
+        """
+        Yield up to max_results rows from the mirrors. The md5s of the rows are added to seen, and rows whose md5 is
+        already in it are skipped.
+        """
+        start = monotonic()
+        # The timeout is for the whole search, once it runs out the results found so far are all that is returned
+        deadline = Deadline(timeout)
+        pages = ceil(max_results / RESULTS_PER_PAGE)
+        window = max(1, min(self.config.get('concurrent_pages', DEFAULT_CONCURRENT_PAGES), pages))
+        counter = max_results
+        # The same book can be on two pages, e.g. when the results change between requests or a mirror that was
+        # switched to orders them differently. It is only shown once and doesn't count towards max_results.
+        if seen is None:
+            seen = set()
+        duplicates = 0
+        self.mirror_health.probe_in_background(self.config.get('mirrors', DEFAULT_MIRRORS))
+
+        # The first page is parsed in this thread while it downloads, so its rows show up as soon as possible.
+        # The pages after it are fetched by the pool at the same time.
+        executor = ThreadPoolExecutor(max_workers=window)
+        next_page = min(window, pages) + 1
+        futures = deque(executor.submit(self._get_page, url, page, deadline) for page in range(2, next_page))
+        first_page = rows = self._iter_page(url, 1, deadline)
+        try:
+            while True:
+                empty = True
+                try:
+                    for row in rows:
+                        empty = False
+                        if row.md5 in seen:
+                            duplicates += 1
+                            self.stats.count('search.duplicates')
+                            continue
+                        seen.add(row.md5)
+                        if counter == max_results:
+                            self.stats.record('search.first_result', monotonic() - start)
+                        yield row
+                        counter -= 1
+                        if counter <= 0:
+                            if prefetch and max_results % RESULTS_PER_PAGE == 0:
+                                # The last page was full, so a search for more results would want the next one
+                                key = 'search:' + url.format(base='', page=pages + 1)
+                                self.prefetcher.submit(key, self._prefetch_page, url, pages + 1,
+                                                       timeout=PREFETCH_TIMEOUT)
+                            return
+                except DeadlineExceeded:
+                    self.stats.count('search.deadline_exceeded')
+                    return
+                if empty:
+                    return
+                # Fetch more pages to make up for the duplicates
+                pages = max(pages, ceil((max_results + duplicates) / RESULTS_PER_PAGE))
+                if next_page <= pages:
+                    futures.append(executor.submit(self._get_page, url, next_page, deadline))
+                    next_page += 1
+                if not futures:
+                    return
+                try:
+                    rows = futures.popleft().result(timeout=deadline.remaining())
+                except (DeadlineExceeded, FutureTimeoutError):
+                    self.stats.count('search.deadline_exceeded')
+                    return
+        finally:
+            first_page.close()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+            self._save_mirror_health()
+            self.stats.record('search', monotonic() - start)
+
+    def _get_page(self, url: str, page: int, deadline: Deadline) -> List[Row]:
+        return list(self._iter_page(url, page, deadline))
+
+    def _iter_page(self, url: str, page: int, deadline: Deadline) -> Generator[Row, None, None]:
+        url = url.format(base='{base}', page=page)
+        rows = self.prefetcher.get('search:' + url.format(base=''), deadline.remaining())
+        cache = self.cache
+        if rows is None and cache is not None:
+            rows = cache.get('search:' + url.format(base=''))
+        if rows is not None:
+            # The cache stores them as lists
+            yield from map(Row._make, rows)
+            return
+        fetch = self._fetch_page(url, deadline)
+        try:
+            for row in fetch:
+                yield row
+        except GeneratorExit:
+            # The search has all the rows it wants, read the rest of the page in the background so that it is
+            # still cached and indexed and the mirror's score is updated
+            Thread(target=self._finish_page, args=(fetch,), name='AnnasArchivePage', daemon=True).start()
+            raise
+
+    def _finish_page(self, fetch: Rows):
+        try:
+            for _ in fetch:
+                pass
+        except Exception:
+            # Nobody is waiting for these rows anymore
+            self.stats.count('search.unfinished_pages')
+
+    def _prefetch_page(self, url: str, page: int, deadline: Deadline) -> Optional[List[Row]]:
+        url = url.format(base='{base}', page=page)
+        cache = self.cache
+        if cache is not None and cache.get('search:' + url.format(base='')) is not None:
+            return None
+        with self.stats.timer('prefetch.page'):
+            return list(self._fetch_page(url, deadline))
+
+    def _fetch_page(self, url: str, deadline: Deadline) -> Generator[Row, None, None]:
+        cache = self.cache
+        index = self.index
+        # Rows are added to the index a few at a time as they come in
+        unindexed = []
+        rows = None
+        mirrors = self.mirror_health.available(self.config.get('mirrors', DEFAULT_MIRRORS))
+        for i, mirror in enumerate(mirrors):
+            if not self.mirror_health.try_acquire(mirror):
+                continue
+            if rows is not None:
+                self.stats.count('search.retries')
+            self._wait_for_rate_limit(deadline)
+            start = monotonic()
+            # If a mirror fails part way through the page, skip the rows that were already read from the next one.
+            # By md5, as the mirrors don't always order the results the same way.
+            read = [] if rows is None else rows
+            read_md5s = {row.md5 for row in read}
+            rows = None
+            # Leave time to try the other mirrors if this one doesn't answer
+            timeout = deadline.timeout() / (len(mirrors) - i)
+            try:
+                with closing(self.session.open(url.format(base=mirror), timeout=timeout)) as resp:
+                    chunks = TimedIterator(resp.iter_content())
+                    parsed = TimedIterator(parse_rows(chunks))
+                    for row in parsed:
+                        if row.md5 not in read_md5s:
+                            read_md5s.add(row.md5)
+                            read.append(row)
+                            yield row
+                            unindexed.append(row)
+                            if len(unindexed) >= INDEX_BATCH_SIZE:
+                                self._add_to_index(index, unindexed)
+                                unindexed = []
+                        if deadline.expired:
+                            raise DeadlineExceeded()
+                rows = read
+                self.mirror_health.record_success(mirror, monotonic() - start)
+                self.stats.record('search.page', monotonic() - start, mirror)
+                self.stats.record('search.network', chunks.elapsed, mirror)
+                self.stats.record('search.parse', parsed.elapsed - chunks.elapsed)
+            except (DeadlineExceeded, PoolTimeout):
+                # The search ran out of time or all our connections to the mirror were busy, it isn't the mirror's
+                # fault. DeadlineExceeded and PoolTimeout are OSErrors, so this has to come first.
+                if deadline.expired:
+                    raise DeadlineExceeded()
+                self.stats.count('search.pool_timeouts')
+                rows = read
+                continue
+            except (HTTPException, OSError):
+                self.mirror_health.record_failure(mirror)
+                self.stats.count('search.errors')
+                if deadline.expired:
+                    raise DeadlineExceeded()
+                rows = read
+                continue
+            self.working_mirror = mirror
+            break
+        else:
+            self.working_mirror = None
+            raise Exception('No working mirrors of Anna\'s Archive found.')
+
+        self._add_to_index(index, unindexed)
+        if cache is not None:
+            cache.set('search:' + url.format(base=''), rows,
+                      self.config.get('cache', {}).get('ttl', DEFAULT_CACHE_TTL) * 60 * 60)
+
+    def _add_to_index(self, index: Optional[ResultIndex], rows: List[Row]):
+        if index is not None and rows:
+            with self.stats.timer('index.add'):
+                index.add(rows)
+
+    def _save_mirror_health(self):
+        try:
+            self.mirror_health.save()
+        except Exception as e:
+            # The scores are only lost until the next save, that is no reason to fail a search
+            self.log(f"Anna's Archive: couldn't save the mirror scores: {e}")
+
+    def _save_resolvers(self):
+        try:
+            self.resolvers.save()
+        except Exception as e:
+            # Like the mirror scores, the resolver scores are saved again later
+            self.log(f"Anna's Archive: couldn't save the resolver scores: {e}")
+
+    def _wait_for_rate_limit(self, deadline: Deadline):
+        if not self.rate_limit.acquire(deadline.remaining()):
+            raise DeadlineExceeded()
+
+    def search_url(self, query: str) -> str:
+        """
+        Url of the search with the configured search options, with {base} and {page} left to fill in.
+        """
+        url = f'{{base}}/search?page={{page}}&q={quote_plus(query)}&display=table'
+        search_opts = self.config.get('search', {})
+        for option in SearchOption.options:
+            value = search_opts.get(option.config_option, ())
+            if isinstance(value, str):
+                value = (value,)
+            for item in value:
+                url += f'&{option.url_param}={item}'
+        return url
+
+    def search(self, query: str, max_results=10, timeout=60, prefetch=True) -> Rows:
+        """
+        Yield the rows of the results of the query in order, until max_results rows or the timeout.
+        The matches in the index of seen results come first, up to half of max_results so that there is room for
+        new books, then the live results that weren't among them. If the mirrors fail or don't have enough results,
+        the other matches from the index make up the rest. With a search option other than the file type set, the
+        index is only used when the mirrors fail.
+        If prefetch is true, the download links of the top results are looked up in the background
+        once the search is done, and the prefetches of the previous search are cancelled.
+        """
+        top = self.config.get('prefetch', DEFAULT_PREFETCH_RESULTS) if prefetch else 0
+        if top:
+            self.prefetcher.cancel()
+        # Only the rows that are prefetched are kept, not every result of a long search
+        top_rows = []
+        seen = set()
+        local = []
+        # The index only knows the file types of its rows, with any other search option set its matches might not
+        # be results of this search, so they are only shown when the mirrors can't be reached
+        search_opts = self.config.get('search', {})
+        filtered = any(search_opts.get(option.config_option) for option in SearchOption.options
+                       if option.config_option != 'filetype')
+        index = self.index
+        if index is not None:
+            with self.stats.timer('index.search'):
+                local = index.search(query, max_results, search_opts.get('filetype', ()))
+            for row in local[:max_results // 2] if not filtered else ():
+                seen.add(row.md5)
+                if len(top_rows) < top:
+                    top_rows.append(row)
+                yield row
+
+        offline = False
+        try:
+            if len(seen) < max_results:
+                # The live results that were already shown from the index are skipped and don't count
+                for row in self._search(self.search_url(query), max_results - len(seen), timeout,
+                                        prefetch=bool(top), seen=seen):
+                    if len(top_rows) < top:
+                        top_rows.append(row)
+                    yield row
+        except Exception as e:
+            if not local:
+                raise
+            # The results from the index are better than an error when the mirrors are down
+            offline = True
+            self.stats.count('index.offline')
+            self.log(f"Anna's Archive: only showing results seen before, the search failed: {e}")
+
+        found = len(seen)
+        for row in local if offline or not filtered else ():
+            if found >= max_results:
+                break
+            if row.md5 not in seen:
+                seen.add(row.md5)
+                found += 1
+                if len(top_rows) < top:
+                    top_rows.append(row)
+                yield row
+
+        for md5, _, _, formats, _ in top_rows:
+            if formats:
+                self.prefetcher.submit(f'downloads:{md5}:{formats}', self._prefetch_downloads, md5, formats,
+                                       timeout=PREFETCH_TIMEOUT)
+
+    def search_many(self, queries: Iterable[str], max_results=10, timeout=60, workers: int = BATCH_WORKERS,
+                    done: Optional[Callable[[str], None]] = None, stop: Optional[Event] = None) -> BatchRows:
+        """
+        Search for every query, workers of them at a time, and yield (query, row) pairs as they are found.
+        The searches share the connections, mirror scores and rate limit, the timeout is per query.
+        done is called with each query when its search has finished, a search that fails is logged and skipped.
+        Setting stop, e.g. from another thread, ends the batch: the searches that haven't started are skipped and
+        the running ones end at their next result. It is set when the generator is closed too.
+        """
+        start = monotonic()
+        queries = list(dict.fromkeys(queries))
+        results = Queue()
+        if stop is None:
+            stop = Event()
+        finished = object()
+
+        def run(query: str):
+            if stop.is_set():
+                # Wakes up the generator, which then sees that the batch is stopped
+                results.put((query, finished))
+                return
+            try:
+                with closing(self.search(query, max_results, timeout, prefetch=False)) as found:
+                    for result in found:
+                        if stop.is_set():
+                            break
+                        results.put((query, result))
+            except Exception as e:
+                self.stats.count('batch.errors')
+                self.log(f"Anna's Archive: search for {query!r} failed: {e}")
+            finally:
+                self.stats.count('batch.queries')
+                results.put((query, finished))
+
+        # More workers than connections per mirror would only wait for each other
+        executor = ThreadPoolExecutor(max_workers=max(1, min(workers, MAX_CONNECTIONS_PER_HOST)))
+        futures = [executor.submit(run, query) for query in queries]
+        try:
+            remaining = len(queries)
+            while remaining:
+                query, result = results.get()
+                if stop.is_set():
+                    break
+                if result is finished:
+                    remaining -= 1
+                    if done is not None:
+                        done(query)
+                else:
+                    yield query, result
+        finally:
+            stop.set()
+            for future in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+            self.stats.record('batch', monotonic() - start)
+
+    def with_covers(self, rows: Iterable[Row],
+                    fetched: Optional[Callable[[Row, bytes], None]] = None) -> RowsWithCovers:
+        """
+        Yield every row as soon as it comes in, with its cover image if it is in the cover cache.
+        The cover is None if there is no cover cache, the row has no cover or it hasn't been downloaded yet.
+        Covers that aren't in the cache are downloaded in the background, COVER_WORKERS at a time, and fetched is
+        called from another thread with the row and its cover once it is in the cache.
+        """
+        covers = self.covers
+        for row in rows:
+            cover = None
+            pending = None
+            if covers is not None and row.cover_url:
+                cover = covers.get(row.cover_url)
+                if cover is None:
+                    pending = self.cover_prefetcher.submit('cover:' + row.cover_url, self._prefetch_cover, covers,
+                                                           row.cover_url, timeout=COVER_TIMEOUT)
+            yield row, cover
+            # Only after the row is yielded, the caller doesn't know about it before that
+            if fetched is not None and pending is not None:
+                pending.add_done_callback(partial(self._cover_fetched, covers, row, fetched))
+
+    @staticmethod
+    def _cover_fetched(covers: CoverCache, row: Row, fetched: Callable[[Row, bytes], None], _: Future):
+        cover = covers.get(row.cover_url)
+        if cover is not None:
+            fetched(row, cover)
+
+    def _prefetch_cover(self, covers: CoverCache, url: str, deadline: Deadline):
+        """
+        Download a cover into the cover cache. Nothing is returned, so the prefetcher doesn't keep it in memory.
+        """
+        try:
+            with self.stats.timer('covers.fetch', urlsplit(url).netloc), \
+                    closing(self.session.open(url, timeout=deadline.timeout())) as resp:
+                if resp.info().get_content_maintype() != 'image':
+                    self.stats.count('covers.errors')
+                    return
+                data = resp.read()
+        except (HTTPException, OSError, ValueError):
+            self.stats.count('covers.errors')
+            return
+        if self.config.get('covers', {}).get('thumbnails', True):
+            with self.stats.timer('covers.scale'):
+                data = scale_cover(data, COVER_THUMBNAIL_SIZE)
+        covers.set(url, data)
+
+    def get_downloads(self, md5: str, formats: str, timeout=60,
+                      verified: Optional[Callable[[Dict[str, str]], None]] = None) -> Dict[str, str]:
+        """
+        Resolve the download links on the page of a book to direct links, the best download sources first.
+        The keys are the names of the links with the format added, e.g. 'Libgen.li.epub'.
+        If the Content-Type is verified, links that haven't been checked yet are returned straight away with
+        UNVERIFIED added to their name and checked in the background. verified is then called from another thread
+        with the downloads again every time a check finishes: without the links that failed and with the ones that
+        passed named normally.
+        """
+        if not formats:
+            return {}
+        start = monotonic()
+        # The timeout is for the whole lookup, once it runs out the links found so far are all that is returned
+        deadline = Deadline(timeout)
+        key = f'downloads:{md5}:{formats}'
+        downloads = self.prefetcher.get(key, deadline.remaining())
+        if downloads is None:
+            downloads = self._get_downloads(md5, formats, deadline)
+            if downloads and not deadline.expired:
+                self.prefetcher.put(key, downloads)
+        self.stats.record('details', monotonic() - start)
+        if not self.config.get('link', {}).get('content_type', False):
+            return dict(downloads)
+
+        cache = self.cache
+        labelled, unchecked = self._apply_verdicts(downloads, cache)
+
+        def done(url: str, verdict: Optional[Verdict]):
+            if verdict is not None and verified is not None:
+                verified(self._apply_verdicts(downloads, cache)[0])
+
+        for url in unchecked:
+            self.verifier.verify(url, done, cache)
+        return labelled
+
+    def _apply_verdicts(self, downloads: Dict[str, str], cache: Optional[Cache]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        The downloads without the links that failed their check and with the unchecked ones labelled,
+        and the urls of the unchecked ones.
+        """
+        labelled = {}
+        unchecked = []
+        for name, url in downloads.items():
+            verdict = self.verifier.verdict(url, cache)
+            if verdict is None:
+                link_text, _format = name.rsplit('.', 1)
+                labelled[f'{link_text}{UNVERIFIED}.{_format}'] = url
+                unchecked.append(url)
+            elif LinkVerifier.is_good(verdict):
+                labelled[name] = url
+        return labelled, unchecked
+
+    def _prefetch_downloads(self, md5: str, formats: str, deadline: Deadline) -> Optional[Dict[str, str]]:
+        with self.stats.timer('prefetch.details'):
+            downloads = self._get_downloads(md5, formats, deadline)
+        # Cancelled or out of budget, some of the links might be missing
+        return None if deadline.expired else downloads or None
+
+    def _get_downloads(self, md5: str, formats: str, deadline: Deadline) -> Dict[str, str]:
+        downloads = {}
+        _format = '.' + formats.lower()
+
+        cache = self.cache
+        links = cache.get('md5:' + md5) if cache is not None else None
+        if links is None:
+            try:
+                doc = self._get_details_page(md5, deadline)
+            except DeadlineExceeded:
+                self.stats.count('details.deadline_exceeded')
+                return downloads
+
+            links = [
+                (''.join(link.itertext()), link.get('href'))
+                for link in doc.xpath('//div[@id="md5-panel-downloads"]/ul[contains(@class, "list-inside")]/li/a[contains(@class, "js-download-link")]')
+            ]
+            if cache is not None and links:
+                cache.set('md5:' + md5, links, DETAILS_CACHE_TTL)
+
+        ranked = self.resolvers.ranked(links)
+        # 0 resolves every link
+        wanted = self.config.get('link', {}).get('max_links', DEFAULT_MAX_LINKS) or len(ranked)
+        found: Dict[int, str] = {}
+        running: Dict[Future, int] = {}
+        # Links that ran out of time, which says nothing about whether they still work
+        interrupted = 0
+        next_link = 0
+        executor = ThreadPoolExecutor(max_workers=DETAILS_WORKERS)
+        try:
+            while len(found) < wanted:
+                # Only as many links are resolved at the same time as are still needed, the best ranked ones first
+                while next_link < len(ranked) and len(running) < min(wanted - len(found), DETAILS_WORKERS):
+                    _, url, resolver = ranked[next_link]
+                    running[executor.submit(self._resolve_link, resolver, url, _format, deadline)] = next_link
+                    next_link += 1
+                if not running:
+                    break
+                done, _ = wait(running, timeout=deadline.remaining(), return_when=FIRST_COMPLETED)
+                if not done:
+                    self.stats.count('details.timeouts', len(running))
+                    break
+                for future in done:
+                    i = running.pop(future)
+                    if isinstance(future.exception(), (DeadlineExceeded, PoolTimeout)):
+                        interrupted += 1
+                    elif future.exception() is None and (url := future.result()):
+                        found[i] = url
+        finally:
+            for future in running:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        # In the order of the ranking
+        for i in sorted(found):
+            downloads[f"{ranked[i][0]}.{formats}"] = found[i]
+        if cache is not None and not downloads and not running and not interrupted and not deadline.expired:
+            # Every link was resolved and none of them work anymore, so get them from the page again next time
+            cache.delete('md5:' + md5)
+        self._save_resolvers()
+        self.stats.count('details.links', len(links))
+        self.stats.count('details.skipped', len(ranked) - next_link)
+        return downloads
+
+    def _get_details_page(self, md5: str, deadline: Deadline):
+        mirrors = self.mirror_health.available(self.config.get('mirrors', DEFAULT_MIRRORS))
+        for i, mirror in enumerate(mirrors):
+            if not self.mirror_health.try_acquire(mirror):
+                continue
+            self._wait_for_rate_limit(deadline)
+            start = monotonic()
+            timeout = deadline.timeout() / (len(mirrors) - i)
+            try:
+                with closing(self.session.open(self.get_url(md5, mirror), timeout=timeout)) as f:
+                    doc = html.fromstring(f.read())
+            except (DeadlineExceeded, PoolTimeout):
+                # Not the mirror's fault, see _fetch_page
+                if deadline.expired:
+                    raise DeadlineExceeded()
+                self.stats.count('details.pool_timeouts')
+                continue
+            except (HTTPException, OSError) as e:
+                # A missing book isn't the mirror's fault
+                if isinstance(e, HTTPError) and e.code < 500:
+                    raise
+                self.mirror_health.record_failure(mirror)
+                self.stats.count('details.errors')
+                if deadline.expired:
+                    raise DeadlineExceeded()
+                continue
+            self.mirror_health.record_success(mirror, monotonic() - start)
+            self.stats.record('details.page', monotonic() - start, mirror)
+            self.working_mirror = mirror
+            return doc
+        raise Exception('No working mirrors of Anna\'s Archive found.')
+
+    def _resolve_link(self, resolver: Resolver, url: str, _format: str, deadline: Deadline) -> Optional[str]:
+        cache = self.cache
+        cache_key = 'link:' + url
+        resolved = cache.get(cache_key) if cache is not None else None
+        if resolved is None:
+            with self.stats.timer('resolve', resolver.name):
+                resolved = resolver(url, self.session, deadline)
+            if not resolved:
+                return
+            if cache is not None:
+                cache.set(cache_key, resolved, LINK_CACHE_TTL)
+        url = resolved
+
+        link_opts = self.config.get('link', {})
+        # More accurate, get_downloads checks the links in the background
+        if link_opts.get('content_type', False):
+            verdict = self.verifier.verdict(url, cache)
+            if verdict is not None and not LinkVerifier.is_good(verdict):
+                if cache is not None:
+                    cache.delete(cache_key)
+                return
+        elif link_opts.get('url_extension', True):
+            # Speeds it up by checking the extension of the url.
+            # Might miss a direct url that doesn't end with the extension
+            params = url.find("?")
+            if params < 0:
+                params = None
+            if url.endswith(_format, 0, params):
+                return
+        return url
+
+    def get_mirror(self) -> str:
+        """
+        The mirror that worked last, or the best one if its circuit is open or there hasn't been a search yet.
+        """
+        if self.working_mirror is not None and not self.mirror_health.is_open(self.working_mirror):
+            return self.working_mirror
+        return self.mirror_health.available(self.config.get('mirrors', DEFAULT_MIRRORS), trial=False)[0]
+
+    def get_url(self, md5: str, mirror: Optional[str] = None) -> str:
+        return f"{mirror or self.get_mirror()}/md5/{md5}"
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Optional
+
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('CoverCache', 'scale_cover')
+
+
+def scale_cover(data: bytes, size: int) -> bytes:
+    """
+    Downscale a cover to fit in size x size pixels, if calibre's image functions are available.
+    """
+    try:
+        from calibre.utils.img import scale_image
+    except ImportError:
+        return data
+    try:
+        return scale_image(data, width=size, height=size)[-1]
+    except Exception:
+        # Not an image calibre can read, let calibre decide what to do with it when it is shown
+        return data
+
+
+class CoverCache:
+    """
+    Cover images on disk, each stored in a file named after the SHA-1 of its content, so a cover that several
+    results share is only stored once. An SQLite database maps the urls to the files and keeps track of when each
+    file was last used, the least recently used files are removed once they take up more than max_size bytes.
+    """
+
+    def __init__(self, path: str, max_size: int, stats: Optional[Stats] = None):
+        self.path = path
+        self.max_size = max_size
+        self.stats = stats
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.path, 'covers.sqlite'), check_same_thread=False,
+                                         isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(
+                'CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS urls_hash ON urls (hash);'
+                'CREATE TABLE IF NOT EXISTS files ('
+                'hash TEXT PRIMARY KEY, size INTEGER NOT NULL, accessed REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS files_accessed ON files (accessed);'
+            )
+        return self._conn
+
+    def _file(self, digest: str) -> str:
+        return os.path.join(self.path, digest[:2], digest)
+
+    def get(self, url: str) -> Optional[bytes]:
+        data = None
+        with self._lock:
+            row = self.conn.execute('SELECT hash FROM urls WHERE url = ?', (url,)).fetchone()
+            if row is not None:
+                try:
+                    with open(self._file(row[0]), 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    # Removed outside of the plugin
+                    self._remove(row[0])
+                else:
+                    self.conn.execute('UPDATE files SET accessed = ? WHERE hash = ?', (time(), row[0]))
+        if self.stats is not None:
+            self.stats.count(f"cache.cover.{'miss' if data is None else 'hit'}")
+        return data
+
+    def set(self, url: str, data: bytes):
+        digest = hashlib.sha1(data).hexdigest()
+        path = self._file(digest)
+        with self._lock:
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                # Written under another name first, so a half written file is never read
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(data)
+                os.replace(path + '.tmp', path)
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.execute('INSERT OR REPLACE INTO files (hash, size, accessed) VALUES (?, ?, ?)',
+                                  (digest, len(data), time()))
+                self.conn.execute('INSERT OR REPLACE INTO urls (url, hash) VALUES (?, ?)', (url, digest))
+                self._evict()
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def clear(self):
+        with self._lock:
+            for (digest,) in self.conn.execute('SELECT hash FROM files').fetchall():
+                self._remove(digest)
+            self.conn.execute('VACUUM')
+
+    def size(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0]
+
+    def _remove(self, digest: str):
+        self.conn.execute('DELETE FROM urls WHERE hash = ?', (digest,))
+        self.conn.execute('DELETE FROM files WHERE hash = ?', (digest,))
+        try:
+            os.remove(self._file(digest))
+        except OSError:
+            pass
+
+    def _evict(self):
+        excess = self.conn.execute('SELECT COALESCE(SUM(size), 0) FROM files').fetchone()[0] - self.max_size
+        if excess <= 0:
+            return
+        digests = []
+        for digest, size in self.conn.execute('SELECT hash, size FROM files ORDER BY accessed').fetchall():
+            digests.append(digest)
+            excess -= size
+            if excess <= 0:
+                break
+        for digest in digests:
+            self._remove(digest)
@@ -0,0 +1,38 @@
+from time import monotonic
+
+__all__ = ('Deadline', 'DeadlineExceeded')
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    """
+    Time budget for a whole operation, every request in it gets the time that is left as its timeout.
+    """
+
+    def __init__(self, seconds: float):
+        self.expires = monotonic() + seconds
+
+    @property
+    def expired(self) -> bool:
+        return monotonic() >= self.expires
+
+    def cancel(self):
+        """
+        End the operation early, its next request raises DeadlineExceeded.
+        """
+        self.expires = float('-inf')
+
+    def remaining(self) -> float:
+        return max(self.expires - monotonic(), 0.0)
+
+    def timeout(self) -> float:
+        """
+        Timeout for the next request, raises DeadlineExceeded if the budget has run out.
+        """
+        remaining = self.expires - monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded('The time for this operation has run out')
+        return remaining
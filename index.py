@@ -0,0 +1,114 @@
+import os
+import re
+import sqlite3
+from threading import Lock
+from time import time
+from typing import Iterable, List, Optional
+
+from calibre_plugins.store_annas_archive.results import Row
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('ResultIndex',)
+
+_words = re.compile(r'\w+')
+
+
+class ResultIndex:
+    """
+    Full-text index of every search result that has been seen, backed by SQLite FTS5.
+    Titles and authors are searchable, once there are more than max_entries results
+    the ones that were seen the longest ago are removed.
+    """
+
+    def __init__(self, path: str, max_entries: int, stats: Optional[Stats] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = stats
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'id INTEGER PRIMARY KEY, md5 TEXT UNIQUE NOT NULL, title TEXT NOT NULL, author TEXT NOT NULL, '
+                'formats TEXT NOT NULL, cover_url TEXT NOT NULL, seen REAL NOT NULL);'
+                'CREATE INDEX IF NOT EXISTS results_seen ON results (seen);'
+                # Only the text is in the FTS table, the rows stay in results
+                'CREATE VIRTUAL TABLE IF NOT EXISTS results_fts USING fts5('
+                'title, author, content=results, content_rowid=id, tokenize="unicode61 remove_diacritics 2");'
+                'CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results BEGIN '
+                'INSERT INTO results_fts (rowid, title, author) VALUES (new.id, new.title, new.author); END;'
+                'CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results BEGIN '
+                'INSERT INTO results_fts (results_fts, rowid, title, author) '
+                'VALUES (\'delete\', old.id, old.title, old.author); END;'
+                'CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF title, author ON results BEGIN '
+                'INSERT INTO results_fts (results_fts, rowid, title, author) '
+                'VALUES (\'delete\', old.id, old.title, old.author); '
+                'INSERT INTO results_fts (rowid, title, author) VALUES (new.id, new.title, new.author); END;'
+            )
+        return self._conn
+
+    def add(self, rows: Iterable[Row]):
+        """
+        Add results, or update them and mark them as just seen if they are already in the index.
+        """
+        now = time()
+        with self._lock:
+            self.conn.execute('BEGIN')
+            try:
+                self.conn.executemany(
+                    'INSERT INTO results (md5, title, author, formats, cover_url, seen) VALUES (?, ?, ?, ?, ?, ?) '
+                    'ON CONFLICT (md5) DO UPDATE SET title = excluded.title, author = excluded.author, '
+                    'formats = excluded.formats, cover_url = excluded.cover_url, seen = excluded.seen',
+                    ((*row, now) for row in rows)
+                )
+                self._prune()
+                self.conn.execute('COMMIT')
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+
+    def search(self, query: str, limit: int, formats: Iterable[str] = ()) -> List[Row]:
+        """
+        The best matches for query, every word of it has to be the start of a word in the title or author.
+        If formats is given only results in one of them are returned.
+        """
+        words = _words.findall(query)
+        if not words:
+            return []
+        match = ' '.join(f'"{word}"*' for word in words)
+        sql = ('SELECT results.md5, results.title, results.author, results.formats, results.cover_url '
+               'FROM results_fts JOIN results ON results.id = results_fts.rowid WHERE results_fts MATCH ?')
+        params = [match]
+        formats = [_format.upper() for _format in formats]
+        if formats:
+            sql += f" AND results.formats IN ({', '.join('?' * len(formats))})"
+            params += formats
+        sql += ' ORDER BY bm25(results_fts) LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = [Row._make(row) for row in self.conn.execute(sql, params)]
+        if self.stats is not None:
+            self.stats.count(f"index.{'hit' if rows else 'miss'}")
+        return rows
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute('DELETE FROM results')
+            self.conn.execute('INSERT INTO results_fts (results_fts) VALUES (\'rebuild\')')
+            self.conn.execute('VACUUM')
+
+    def size(self) -> int:
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def _prune(self):
+        excess = self.conn.execute('SELECT COUNT(*) FROM results').fetchone()[0] - self.max_entries
+        if excess > 0:
+            self.conn.execute('DELETE FROM results WHERE id IN (SELECT id FROM results ORDER BY seen LIMIT ?)',
+                              (excess,))
@@ -0,0 +1,40 @@
+from threading import Lock
+from time import monotonic, sleep
+from typing import Optional
+
+__all__ = ('TokenBucket',)
+
+
+class TokenBucket:
+    """
+    Rate limit shared between threads: on average rate requests per second, with bursts of up to burst requests.
+    A rate of 0 turns the limit off.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = monotonic()
+        self._lock = Lock()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until a request can be sent and take a token for it.
+        Returns False without taking a token if that would take longer than timeout seconds.
+        """
+        end = None if timeout is None else monotonic() + timeout
+        while True:
+            with self._lock:
+                if self.rate <= 0:
+                    return True
+                now = monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if end is not None and now + wait > end:
+                return False
+            sleep(wait)
@@ -0,0 +1,245 @@
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.client import HTTPException
+from threading import Lock, Thread
+from time import monotonic, time
+from typing import Dict, Iterable, List, Optional
+from urllib.error import HTTPError
+
+from calibre_plugins.store_annas_archive.session import PoolTimeout, Session
+
+__all__ = ('CircuitBreaker', 'MirrorHealth')
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.3
+# Latency assumed for a mirror that has never been measured
+UNKNOWN_LATENCY = 1.0
+PROBE_INTERVAL = 60 * 60
+# Consecutive failures after which a mirror is skipped
+FAILURE_THRESHOLD = 2
+# Seconds a mirror is skipped the first time, doubled every time the trial request after it fails too
+BASE_BACKOFF = 30
+MAX_BACKOFF = 30 * 60
+# Seconds after which another trial request is allowed if the previous one never reported back
+TRIAL_TIMEOUT = 60
+# Seconds between saving the scores to the config
+SAVE_INTERVAL = 60
+
+
+def _update_config(config, values: Dict):
+    """
+    Set several keys of the config at once. calibre's JSONConfig writes the whole file on every change,
+    inside its with block it only writes it once at the end.
+    """
+    if hasattr(config, 'commit'):
+        with config:
+            for key, value in values.items():
+                config[key] = value
+    else:
+        config.update(values)
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a mirror after FAILURE_THRESHOLD consecutive failures.
+    Once the backoff has passed the circuit is half-open and a single trial request is let through:
+    if it succeeds the circuit closes again, if it fails it opens again for twice as long.
+    It isn't thread safe, MirrorHealth locks around it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self):
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._trial_start: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self.failures < FAILURE_THRESHOLD:
+            return self.CLOSED
+        if monotonic() < self.open_until:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    @property
+    def backoff(self) -> float:
+        return min(BASE_BACKOFF * 2 ** max(self.trips - 1, 0), MAX_BACKOFF)
+
+    def allow(self, take_trial: bool = True) -> bool:
+        """
+        Whether a request can be sent, in the half-open state this takes the trial request unless take_trial is false.
+        """
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.OPEN:
+            return False
+        now = monotonic()
+        if self._trial_start is not None and now - self._trial_start < TRIAL_TIMEOUT:
+            return False
+        if take_trial:
+            self._trial_start = now
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.trips = 0
+        self._trial_start = None
+
+    def record_failure(self):
+        # Requests that were already under way when the circuit opened don't make the backoff longer
+        if self.state == self.OPEN:
+            return
+        self.failures += 1
+        self._trial_start = None
+        if self.failures >= FAILURE_THRESHOLD:
+            self.trips += 1
+            self.open_until = monotonic() + self.backoff
+
+
+class MirrorHealth:
+    """
+    Keeps a moving average of the latency and error rate of each mirror and orders mirrors by it.
+    The scores are stored in the plugin config under 'mirror_stats' so they survive restarts.
+    Every mirror also has a CircuitBreaker, mirrors that keep failing are skipped for a while.
+    """
+
+    def __init__(self, config, session: Optional[Session]):
+        self.config = config
+        self.session = session
+        self._lock = Lock()
+        self._probing = False
+        self._last_save = float('-inf')
+        stats = config.get('mirror_stats', {})
+        self.stats: Dict[str, Dict[str, float]] = {mirror: dict(values) for mirror, values in stats.items()}
+        self.last_probe: float = config.get('mirror_probe_time', 0)
+        self.breakers: Dict[str, CircuitBreaker] = defaultdict(CircuitBreaker)
+
+    def record_success(self, mirror: str, latency: float):
+        with self._lock:
+            self.breakers[mirror].record_success()
+            stats = self.stats.setdefault(mirror, {'latency': latency, 'error_rate': 0.0})
+            stats['latency'] += EWMA_ALPHA * (latency - stats['latency'])
+            stats['error_rate'] -= EWMA_ALPHA * stats['error_rate']
+
+    def record_failure(self, mirror: str):
+        """
+        Connection errors, timeouts and 5xx responses are all failures.
+        """
+        with self._lock:
+            self.breakers[mirror].record_failure()
+            stats = self.stats.setdefault(mirror, {'latency': UNKNOWN_LATENCY, 'error_rate': 1.0})
+            stats['error_rate'] += EWMA_ALPHA * (1 - stats['error_rate'])
+
+    def get(self, mirror: str) -> Optional[Dict[str, float]]:
+        return self.stats.get(mirror)
+
+    def state(self, mirror: str) -> str:
+        with self._lock:
+            return self.breakers[mirror].state
+
+    def is_open(self, mirror: str) -> bool:
+        return self.state(mirror) == CircuitBreaker.OPEN
+
+    def score(self, mirror: str) -> float:
+        """
+        Expected time in seconds to get a successful response from the mirror, lower is better.
+        """
+        stats = self.stats.get(mirror)
+        if stats is None:
+            return UNKNOWN_LATENCY
+        return stats['latency'] / max(1 - stats['error_rate'], 0.05)
+
+    def ordered(self, mirrors: Iterable[str]) -> List[str]:
+        # sorted is stable, so mirrors with equal scores keep the user's order
+        return sorted(mirrors, key=self.score)
+
+    def available(self, mirrors: Iterable[str], trial: bool = True) -> List[str]:
+        """
+        The mirrors ordered by score, without the ones whose circuit is open.
+        With trial set a half-open mirror is only included if its trial request hasn't been taken yet,
+        without it half-open mirrors are always included. Call try_acquire() before sending a request to one.
+        If every circuit is open the mirror whose backoff ends first is returned, so there is still one to try.
+        """
+        mirrors = self.ordered(mirrors)
+        with self._lock:
+            allowed = [
+                mirror for mirror in mirrors
+                if (self.breakers[mirror].allow(take_trial=False) if trial
+                    else self.breakers[mirror].state != CircuitBreaker.OPEN)
+            ]
+            if not allowed and mirrors:
+                allowed = [min(mirrors, key=lambda mirror: self.breakers[mirror].open_until)]
+        return allowed
+
+    def try_acquire(self, mirror: str) -> bool:
+        """
+        Call right before sending a request to a mirror from available(). If the mirror is half-open this takes its
+        trial request, False means another request has already taken it.
+        """
+        with self._lock:
+            breaker = self.breakers[mirror]
+            return breaker.state != CircuitBreaker.HALF_OPEN or breaker.allow()
+
+    def save(self, force: bool = False):
+        """
+        Store the scores in the config, at most once every SAVE_INTERVAL seconds unless force is set.
+        """
+        with self._lock:
+            if not force and monotonic() - self._last_save < SAVE_INTERVAL:
+                return
+            self._last_save = monotonic()
+            values = {
+                'mirror_stats': {mirror: dict(values) for mirror, values in self.stats.items()},
+                'mirror_probe_time': self.last_probe,
+            }
+        _update_config(self.config, values)
+
+    def probe(self, mirrors: Iterable[str], timeout: float = 15):
+        """
+        Send a HEAD request to every mirror in parallel and record how long each one takes.
+        """
+        mirrors = list(mirrors)
+        if not mirrors:
+            return
+        with ThreadPoolExecutor(max_workers=len(mirrors)) as executor:
+            for mirror in mirrors:
+                executor.submit(self._probe_mirror, mirror, timeout)
+        self.last_probe = time()
+        self.save(force=True)
+
+    def probe_in_background(self, mirrors: Iterable[str], timeout: float = 15):
+        """
+        Start a probe in a daemon thread if the last one is older than PROBE_INTERVAL.
+        """
+        with self._lock:
+            if self._probing or time() - self.last_probe < PROBE_INTERVAL:
+                return
+            self._probing = True
+
+        def run():
+            try:
+                self.probe(mirrors, timeout)
+            finally:
+                self._probing = False
+
+        Thread(target=run, name='AnnasArchiveMirrorProbe', daemon=True).start()
+
+    def _probe_mirror(self, mirror: str, timeout: float):
+        start = monotonic()
+        try:
+            self.session.head(mirror, timeout=timeout).close()
+        except HTTPError as e:
+            if 500 <= e.code <= 599:
+                self.record_failure(mirror)
+                return
+        except PoolTimeout:
+            # The searches were using every connection to the mirror, which says nothing about it
+            return
+        except (HTTPException, OSError):
+            self.record_failure(mirror)
+            return
+        self.record_success(mirror, monotonic() - start)
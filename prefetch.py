@@ -0,0 +1,161 @@
+from concurrent.futures import CancelledError, Future, TimeoutError as FutureTimeoutError, wait
+from queue import Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from calibre_plugins.store_annas_archive.deadline import Deadline, DeadlineExceeded
+from calibre_plugins.store_annas_archive.limits import TokenBucket
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('Prefetcher', 'PrefetchDeadline')
+
+
+class PrefetchDeadline(Deadline):
+    """
+    Deadline of a prefetch, which also runs out when it is cancelled or the request budget is used up.
+    Every request takes a token from the budget when it asks for its timeout.
+    """
+
+    def __init__(self, seconds: float, budget: TokenBucket):
+        super().__init__(seconds)
+        self.budget = budget
+        self.over_budget = False
+
+    def timeout(self) -> float:
+        remaining = super().timeout()
+        if not self.budget.acquire(0):
+            self.over_budget = True
+            self.cancel()
+            raise DeadlineExceeded('The request budget for prefetching has run out')
+        return remaining
+
+
+class Prefetcher:
+    """
+    Does work that is likely to be needed soon on daemon worker threads, e.g. looking up the download links of
+    the top results while the user reads them, and keeps the results for ttl seconds.
+    Each prefetch has a key, get() returns its result, waiting for it if it is still running.
+    cancel() stops the prefetches that are queued or running, and all of them together only send as many
+    requests as the budget allows.
+    """
+
+    def __init__(self, workers: int, ttl: float, budget: TokenBucket, stats: Optional[Stats] = None):
+        self.workers = workers
+        self.ttl = ttl
+        self.budget = budget
+        self.stats = stats
+        self._lock = Lock()
+        self._queue: Queue = Queue()
+        self._threads: List[Thread] = []
+        self._results: Dict[str, Tuple[float, Future]] = {}
+        self._running: Set[PrefetchDeadline] = set()
+
+    def submit(self, key: str, fn: Callable[..., Any], *args, timeout: float) -> Future:
+        """
+        Call fn(*args, deadline) in the background, unless key has already been prefetched.
+        A result of None, or an exception, means there is nothing to keep.
+        Returns the future of the prefetch of key, the one that was already there if it has been prefetched.
+        """
+        future = Future()
+        with self._lock:
+            self._prune()
+            if key in self._results:
+                return self._results[key][1]
+            self._results[key] = (monotonic() + self.ttl, future)
+            if len(self._threads) < self.workers:
+                thread = Thread(target=self._work, name='AnnasArchivePrefetch', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((future, fn, args, timeout))
+        self._count('prefetch.submitted')
+        return future
+
+    def put(self, key: str, value: Any):
+        """
+        Keep a result that was fetched without prefetching, so that it isn't prefetched again.
+        """
+        future = Future()
+        future.set_result(value)
+        with self._lock:
+            self._results[key] = (monotonic() + self.ttl, future)
+
+    def get(self, key: str, timeout: Optional[float] = None) -> Any:
+        """
+        The result of the prefetch of key, waiting up to timeout seconds if it is running.
+        None if it wasn't prefetched, hasn't started yet or failed, the caller has to do the work itself then.
+        """
+        with self._lock:
+            expires, future = self._results.get(key, (0, None))
+            if future is None:
+                return None
+            if expires <= monotonic() or future.cancel():
+                # Expired, or still queued, in which case it is quicker for the caller to do it now
+                del self._results[key]
+                self._count('prefetch.miss')
+                return None
+        try:
+            result = future.result(timeout)
+        except (CancelledError, FutureTimeoutError, Exception):
+            result = None
+        if result is None:
+            with self._lock:
+                if self._results.get(key, (0, None))[1] is future:
+                    del self._results[key]
+            self._count('prefetch.miss')
+        else:
+            self._count('prefetch.hit')
+        return result
+
+    def cancel(self):
+        """
+        Stop the prefetches that are queued or running, the results of the finished ones are kept.
+        """
+        with self._lock:
+            for key, (_, future) in list(self._results.items()):
+                if not future.done():
+                    future.cancel()
+                    del self._results[key]
+                    self._count('prefetch.cancelled')
+            for deadline in self._running:
+                deadline.cancel()
+
+    def join(self, timeout: Optional[float] = None):
+        """
+        Wait for the queued and running prefetches to finish, e.g. before measuring the next run of a benchmark.
+        """
+        with self._lock:
+            futures = [future for _, future in self._results.values()]
+        wait(futures, timeout)
+
+    def clear(self):
+        self.cancel()
+        with self._lock:
+            self._results.clear()
+
+    def _prune(self):
+        now = monotonic()
+        for key in [key for key, (expires, _) in self._results.items() if expires <= now]:
+            del self._results[key]
+
+    def _work(self):
+        while True:
+            future, fn, args, timeout = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            deadline = PrefetchDeadline(timeout, self.budget)
+            with self._lock:
+                self._running.add(deadline)
+            try:
+                future.set_result(fn(*args, deadline))
+            except BaseException as e:
+                future.set_exception(e)
+            finally:
+                with self._lock:
+                    self._running.discard(deadline)
+                if deadline.over_budget:
+                    self._count('prefetch.over_budget')
+
+    def _count(self, name: str):
+        if self.stats is not None:
+            self.stats.count(name)
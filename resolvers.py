@@ -0,0 +1,195 @@
+import re
+from contextlib import closing
+from http.client import HTTPException
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Tuple
+
+from calibre_plugins.store_annas_archive.deadline import Deadline, DeadlineExceeded
+from calibre_plugins.store_annas_archive.limits import TokenBucket
+from calibre_plugins.store_annas_archive.mirrors import EWMA_ALPHA, UNKNOWN_LATENCY, _update_config
+from calibre_plugins.store_annas_archive.session import PoolTimeout, Session
+from lxml import html
+
+__all__ = ('Resolver', 'Resolvers')
+
+# Seconds between saving the resolver scores to the config
+SAVE_INTERVAL = 60
+
+ResolveFunction = Callable[[str, Session, float], Optional[str]]
+
+
+class Resolver:
+    """
+    Turns the link to a download source on a book's page into a direct download link.
+    It handles the links whose text is one of link_texts or starts with one of link_prefixes, or whose url matches
+    url_pattern. At most concurrency links are resolved at the same time, rate per second on average with bursts of
+    up to burst, and each gets at most timeout seconds. Like a mirror, it keeps moving averages of its latency
+    and error rate, which the Resolvers rank it by.
+    """
+
+    def __init__(self, name: str, resolve: ResolveFunction, link_texts: Iterable[str] = (),
+                 link_prefixes: Iterable[str] = (), url_pattern: Optional[str] = None, concurrency: int = 2,
+                 rate: float = 2, burst: int = 4, timeout: float = 20):
+        self.name = name
+        self.resolve = resolve
+        self.link_texts = frozenset(link_texts)
+        self.link_prefixes = tuple(link_prefixes)
+        self.url_pattern: Optional[Pattern] = re.compile(url_pattern) if url_pattern else None
+        self.timeout = timeout
+        self.rate_limit = TokenBucket(rate, burst)
+        self.stats: Optional[Dict[str, float]] = None
+        self._slots = BoundedSemaphore(concurrency)
+        self._lock = Lock()
+
+    def handles(self, link_text: str, url: str) -> bool:
+        return (link_text in self.link_texts or link_text.startswith(self.link_prefixes)
+                or (self.url_pattern is not None and self.url_pattern.search(url) is not None))
+
+    def __call__(self, url: str, session: Session, deadline: Deadline) -> Optional[str]:
+        """
+        Resolve url within the concurrency, rate limit and timeout of the resolver and the deadline.
+        """
+        if not self._slots.acquire(timeout=deadline.remaining()):
+            raise DeadlineExceeded()
+        try:
+            if not self.rate_limit.acquire(deadline.remaining()):
+                raise DeadlineExceeded()
+            start = monotonic()
+            try:
+                resolved = self.resolve(url, session, min(self.timeout, deadline.timeout()))
+            except (DeadlineExceeded, PoolTimeout):
+                # The time ran out or the connections were busy, neither says anything about the resolver
+                raise
+            except (HTTPException, OSError, ValueError):
+                self.record_failure()
+                raise
+            if resolved:
+                self.record_success(monotonic() - start)
+            else:
+                self.record_failure()
+            return resolved
+        finally:
+            self._slots.release()
+
+    def record_success(self, latency: float):
+        with self._lock:
+            if self.stats is None:
+                self.stats = {'latency': latency, 'error_rate': 0.0}
+            self.stats['latency'] += EWMA_ALPHA * (latency - self.stats['latency'])
+            self.stats['error_rate'] -= EWMA_ALPHA * self.stats['error_rate']
+
+    def record_failure(self):
+        """
+        Errors and pages without a download link are both failures.
+        """
+        with self._lock:
+            if self.stats is None:
+                self.stats = {'latency': UNKNOWN_LATENCY, 'error_rate': 1.0}
+            self.stats['error_rate'] += EWMA_ALPHA * (1 - self.stats['error_rate'])
+
+    def score(self) -> float:
+        """
+        Expected time in seconds to get a direct link from this resolver, lower is better.
+        """
+        if self.stats is None:
+            return UNKNOWN_LATENCY
+        return self.stats['latency'] / max(1 - self.stats['error_rate'], 0.05)
+
+
+class Resolvers:
+    """
+    The registered resolvers, with their scores stored in the plugin config under 'resolver_stats'.
+    """
+
+    def __init__(self, config, resolvers: Iterable[Resolver] = ()):
+        self.config = config
+        self.resolvers: List[Resolver] = []
+        self._last_save = monotonic()
+        self._lock = Lock()
+        for resolver in resolvers:
+            self.register(resolver)
+
+    def register(self, resolver: Resolver) -> Resolver:
+        """
+        Add a resolver, links are resolved by the first registered resolver that handles them.
+        """
+        stats = self.config.get('resolver_stats', {}).get(resolver.name)
+        if stats is not None:
+            resolver.stats = dict(stats)
+        self.resolvers.append(resolver)
+        return resolver
+
+    def find(self, link_text: str, url: str) -> Optional[Resolver]:
+        for resolver in self.resolvers:
+            if resolver.handles(link_text, url):
+                return resolver
+        return None
+
+    def ranked(self, links: Iterable[Tuple[str, str]]) -> List[Tuple[str, str, Resolver]]:
+        """
+        The links that a resolver handles with their resolver, the fastest and most reliable resolvers first.
+        """
+        found = []
+        for link_text, url in links:
+            resolver = self.find(link_text, url)
+            if resolver is not None:
+                found.append((link_text, url, resolver))
+        # sorted is stable, so links with equal scores keep the order of the page
+        return sorted(found, key=lambda link: link[2].score())
+
+    def save(self, force: bool = False):
+        """
+        Store the scores in the config, at most once every SAVE_INTERVAL seconds unless force is set.
+        """
+        with self._lock:
+            if not force and monotonic() - self._last_save < SAVE_INTERVAL:
+                return
+            self._last_save = monotonic()
+            values = {'resolver_stats': {
+                resolver.name: dict(resolver.stats) for resolver in self.resolvers if resolver.stats is not None
+            }}
+        _update_config(self.config, values)
+
+    @classmethod
+    def default(cls, config) -> 'Resolvers':
+        return cls(config, (
+            Resolver('libgen', _get_libgen_link, link_texts=('Libgen.li',)),
+            Resolver('libgen_nonfiction', _get_libgen_nonfiction_link,
+                     link_texts=('Libgen.rs Fiction', 'Libgen.rs Non-Fiction')),
+            Resolver('scihub', _get_scihub_link, link_prefixes=('Sci-Hub',)),
+            Resolver('zlib', _get_zlib_link, link_texts=('Z-Library',)),
+        ))
+
+
+def _get_libgen_link(url: str, session: Session, timeout: float) -> str:
+    with closing(session.open(url, timeout=timeout)) as resp:
+        doc = html.fromstring(resp.read())
+        scheme, _, host, _ = resp.geturl().split('/', 3)
+    url = ''.join(doc.xpath('//a[h2[text()="GET"]]/@href'))
+    return f"{scheme}//{host}/{url}"
+
+
+def _get_libgen_nonfiction_link(url: str, session: Session, timeout: float) -> str:
+    with closing(session.open(url, timeout=timeout)) as resp:
+        doc = html.fromstring(resp.read())
+    url = ''.join(doc.xpath('//h2/a[text()="GET"]/@href'))
+    return url
+
+
+def _get_scihub_link(url, session: Session, timeout: float):
+    with closing(session.open(url, timeout=timeout)) as resp:
+        doc = html.fromstring(resp.read())
+        scheme, _ = resp.geturl().split('/', 1)
+    url = ''.join(doc.xpath('//embed[@id="pdf"]/@src'))
+    if url:
+        return scheme + url
+
+
+def _get_zlib_link(url, session: Session, timeout: float):
+    with closing(session.open(url, timeout=timeout)) as resp:
+        doc = html.fromstring(resp.read())
+        scheme, _, host, _ = resp.geturl().split('/', 3)
+    url = ''.join(doc.xpath('//a[contains(@class, "addDownloadedBook")]/@href'))
+    if url:
+        return f"{scheme}//{host}/{url}"
@@ -0,0 +1,100 @@
+from typing import Generator, Iterable, List, NamedTuple, Optional
+
+from calibre_plugins.store_annas_archive.constants import FileType
+from lxml import etree
+
+__all__ = ('Row', 'parse_row', 'parse_rows')
+
+
+class Row(NamedTuple):
+    """
+    The scraped fields of a search result. It is a plain tuple, so thousands of rows take little memory
+    and it can be stored as a JSON list. The store only turns the rows it shows into SearchResults.
+    """
+    md5: str
+    title: str
+    author: str
+    formats: str
+    cover_url: str
+
+
+# Column of each field in the results table
+TITLE_COLUMN = 1
+AUTHOR_COLUMN = 2
+FORMAT_COLUMN = 9
+
+_formats = frozenset(FileType.values)
+
+# Compiled once instead of on every row
+_cover_link = etree.XPath('./a[@tabindex="-1"]')
+_any_detail_link = etree.XPath('.//a[contains(@href, "/md5/")]')
+_cover_src = etree.XPath('string((./span/img/@src)[1])')
+_column_text = etree.XPath('./a/span/text()')
+
+
+def parse_rows(chunks: Iterable[bytes]) -> Generator[Row, None, None]:
+    """
+    Parse the results table incrementally, yielding each row as soon as it has been downloaded.
+    """
+    parser = etree.HTMLPullParser(events=('end',), tag='tr')
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from _read_rows(parser)
+    parser.close()
+    yield from _read_rows(parser)
+
+
+def _read_rows(parser) -> Generator[Row, None, None]:
+    for _, book in parser.read_events():
+        table = book.getparent()
+        if table is None or table.tag != 'table':
+            continue
+        row = parse_row(book)
+        # Throw away the rows that have already been parsed so the whole page isn't kept in memory
+        book.clear()
+        while book.getprevious() is not None:
+            del table[0]
+        if row is not None:
+            yield row
+
+
+def parse_row(book) -> Optional[Row]:
+    columns = book.findall('td')
+    if not columns:
+        return
+
+    cover = _cover_link(columns[0])
+    if not cover:
+        # The layout changed, use the first link to a detail page in the row
+        cover = _any_detail_link(book)
+        if not cover:
+            return
+    cover = cover[0]
+    detail_item = cover.get('href', '').split('/')[-1]
+    if not detail_item:
+        return
+
+    return Row(
+        detail_item,
+        _get_text(columns, TITLE_COLUMN),
+        _get_text(columns, AUTHOR_COLUMN),
+        _get_format(columns),
+        _cover_src(cover)
+    )
+
+
+def _get_text(columns: List, index: int) -> str:
+    if index < len(columns):
+        return ''.join(_column_text(columns[index]))
+    return ''
+
+
+def _get_format(columns: List) -> str:
+    _format = _get_text(columns, FORMAT_COLUMN).strip().lower()
+    if _format not in _formats:
+        # The layout changed, look for a column that only contains a known format
+        for column in columns:
+            if (text := ''.join(_column_text(column)).strip().lower()) in _formats:
+                _format = text
+                break
+    return _format.upper()
@@ -0,0 +1,239 @@
+import zlib
+from http.client import HTTPConnection, HTTPSConnection, HTTPException, HTTPResponse, IncompleteRead
+from threading import Lock, BoundedSemaphore
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urljoin, urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('Session', 'Response', 'PoolTimeout')
+
+USER_AGENT = 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0'
+MAX_REDIRECTS = 10
+CHUNK_SIZE = 16 * 1024
+
+PoolKey = Tuple[str, str, int]
+
+
+class PoolTimeout(TimeoutError):
+    """
+    Every connection to the host was in use for the whole timeout, the request wasn't sent.
+    """
+
+
+class _HostPool:
+    def __init__(self, key: PoolKey, limit: int):
+        self.key = key
+        self.semaphore = BoundedSemaphore(limit)
+        self.idle: List[HTTPConnection] = []
+        self.lock = Lock()
+
+    def acquire(self, timeout: Optional[float]) -> Tuple[HTTPConnection, bool]:
+        """
+        Wait for a free slot and return an idle connection, or a new one if there isn't one.
+        The second value is whether the connection has been used before.
+        """
+        if not self.semaphore.acquire(timeout=timeout):
+            raise PoolTimeout(f'No free connection to {self.key[1]}')
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        return self._connect(timeout), False
+
+    def release(self, conn: HTTPConnection, reusable: bool):
+        if reusable:
+            with self.lock:
+                self.idle.append(conn)
+        else:
+            conn.close()
+        self.semaphore.release()
+
+    def _connect(self, timeout: Optional[float]) -> HTTPConnection:
+        scheme, host, port = self.key
+        proxy = getproxies().get(scheme)
+        if proxy and not proxy_bypass(host):
+            proxy = urlsplit(proxy if '://' in proxy else 'http://' + proxy)
+            if scheme == 'https':
+                conn = HTTPSConnection(proxy.hostname, proxy.port or 443, timeout=timeout)
+                conn.set_tunnel(host, port)
+            else:
+                conn = HTTPConnection(proxy.hostname, proxy.port or 80, timeout=timeout)
+            return conn
+        if scheme == 'https':
+            return HTTPSConnection(host, port, timeout=timeout)
+        return HTTPConnection(host, port, timeout=timeout)
+
+
+class Response:
+    """
+    A response from a Session, it has the same interface as the responses from urllib and mechanize.
+    The connection is returned to its pool once the body has been read or the response is closed.
+    """
+
+    def __init__(self, url: str, resp: HTTPResponse, conn: HTTPConnection, pool: _HostPool,
+                 stats: Optional[Stats] = None):
+        self.url = url
+        self.code = self.status = resp.status
+        self.reason = resp.reason
+        self.headers = resp.headers
+        self._resp = resp
+        self._conn = conn
+        self._pool = pool
+        self._stats = stats
+
+        encoding = resp.headers.get('Content-Encoding', '').lower()
+        if encoding in ('gzip', 'x-gzip'):
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        elif encoding == 'deflate':
+            self._decompressor = zlib.decompressobj()
+        else:
+            self._decompressor = None
+
+    def geturl(self) -> str:
+        return self.url
+
+    def info(self):
+        return self.headers
+
+    def iter_content(self, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Yield the decompressed body as it arrives.
+        """
+        try:
+            while chunk := self._resp.read1(chunk_size):
+                if self._stats is not None:
+                    self._stats.count('bytes_read', len(chunk))
+                if self._decompressor is not None:
+                    chunk = self._decompressor.decompress(chunk)
+                if chunk:
+                    yield chunk
+            if self._resp.length:
+                # read1 returns nothing instead of raising when the connection closes before the end of the body
+                raise IncompleteRead(b'', self._resp.length)
+            if self._decompressor is not None and (chunk := self._decompressor.flush()):
+                yield chunk
+        finally:
+            self.close()
+
+    def read(self) -> bytes:
+        return b''.join(self.iter_content())
+
+    def close(self):
+        if self._pool is None:
+            return
+        if self._resp.length == 0:
+            # read1 doesn't notice that the body has ended, read does
+            self._resp.read()
+        reusable = self._resp.isclosed() and not self._resp.will_close
+        if not reusable:
+            self._resp.close()
+        self._pool.release(self._conn, reusable)
+        self._pool = self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Session:
+    """
+    Thread safe HTTP client that keeps connections alive and shares them between requests to the same host.
+    At most max_connections requests are made to a host at the same time, the rest wait for a free connection.
+    """
+
+    def __init__(self, max_connections: int, user_agent: str = USER_AGENT, stats: Optional[Stats] = None):
+        self.max_connections = max_connections
+        self.stats = stats
+        self.headers = {
+            'User-Agent': user_agent,
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        }
+        self._pools: Dict[PoolKey, _HostPool] = {}
+        self._lock = Lock()
+
+    def open(self, url: str, timeout: Optional[float] = None) -> Response:
+        return self.request('GET', url, timeout)
+
+    def head(self, url: str, timeout: Optional[float] = None) -> Response:
+        return self.request('HEAD', url, timeout)
+
+    def request(self, method: str, url: str, timeout: Optional[float] = None,
+                headers: Optional[Dict[str, str]] = None) -> Response:
+        """
+        Make a request, following redirects.
+        Raises HTTPError for 4xx and 5xx responses, like urlopen does.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            resp = self._request(method, url, timeout, headers)
+            location = resp.headers.get('Location')
+            if resp.status not in (301, 302, 303, 307, 308) or not location:
+                break
+            resp.read()
+            url = urljoin(url, location)
+            if resp.status == 303 and method != 'HEAD':
+                method = 'GET'
+        else:
+            raise HTTPError(url, resp.status, 'Too many redirects', resp.headers, None)
+        if resp.status >= 400:
+            resp.close()
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+        return resp
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            with pool.lock:
+                for conn in pool.idle:
+                    conn.close()
+                pool.idle.clear()
+
+    def _get_pool(self, key: PoolKey) -> _HostPool:
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _HostPool(key, self.max_connections)
+            return pool
+
+    def _request(self, method: str, url: str, timeout: Optional[float],
+                 headers: Optional[Dict[str, str]]) -> Response:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        port = parts.port or (443 if scheme == 'https' else 80)
+        pool = self._get_pool((scheme, parts.hostname, port))
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        request_headers = dict(self.headers)
+        if headers:
+            request_headers.update(headers)
+
+        while True:
+            conn, reused = pool.acquire(timeout)
+            if self.stats is not None:
+                self.stats.count('requests')
+                if not reused:
+                    self.stats.count('connections')
+            try:
+                # Requests through a plain http proxy need the absolute url
+                conn.request(method, url if conn.host != parts.hostname and scheme == 'http' else target,
+                             headers=request_headers)
+                resp = conn.getresponse()
+            except (HTTPException, OSError) as e:
+                pool.release(conn, False)
+                if reused and isinstance(e, (HTTPException, ConnectionError)):
+                    # The server probably closed the idle connection, try again with a new one
+                    continue
+                raise
+            if method == 'HEAD':
+                resp.read()
+            return Response(url, resp, conn, pool, self.stats)
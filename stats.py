@@ -0,0 +1,101 @@
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic
+from typing import Callable, Deque, Dict, Iterable, Iterator, Optional, Tuple
+
+__all__ = ('Stats', 'TimedIterator')
+
+# Number of most recent timings kept for each stage
+HISTORY_SIZE = 500
+
+Key = Tuple[str, Optional[str]]
+
+
+class Stats:
+    """
+    Rolling timings of each stage of a search or details lookup, optionally per mirror or host, and counters
+    for things like bytes read, cache hits and retries.
+    If log is set every timing is also passed to it, e.g. to write it to the calibre debug log.
+    """
+
+    def __init__(self, log: Optional[Callable[[str], None]] = None):
+        self.log = log
+        self._lock = Lock()
+        self._timings: Dict[Key, Deque[float]] = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+        self._counters: Dict[str, int] = defaultdict(int)
+
+    def record(self, stage: str, seconds: float, label: Optional[str] = None):
+        with self._lock:
+            self._timings[(stage, label)].append(seconds)
+        if self.log is not None:
+            self.log(f"Anna's Archive: {stage}{f' ({label})' if label else ''} took {seconds * 1000:.0f} ms")
+
+    @contextmanager
+    def timer(self, stage: str, label: Optional[str] = None):
+        start = monotonic()
+        try:
+            yield
+        finally:
+            self.record(stage, monotonic() - start, label)
+
+    def count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] += amount
+
+    def reset(self):
+        with self._lock:
+            self._timings.clear()
+            self._counters.clear()
+
+    def timings(self) -> Dict[Key, Dict[str, float]]:
+        """
+        Summary of the recorded timings of each stage and label: count, mean, p50, p95 and max, in seconds.
+        """
+        with self._lock:
+            timings = {key: sorted(values) for key, values in self._timings.items()}
+        return {
+            key: {
+                'count': len(values),
+                'mean': sum(values) / len(values),
+                'p50': _percentile(values, 0.5),
+                'p95': _percentile(values, 0.95),
+                'max': values[-1],
+            }
+            for key, values in timings.items() if values
+        }
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self) -> dict:
+        timings = sorted(self.timings().items(), key=lambda item: (item[0][0], item[0][1] or ''))
+        return {
+            'timings': {f'{stage} ({label})' if label else stage: values for (stage, label), values in timings},
+            'counters': self.counters(),
+        }
+
+
+class TimedIterator:
+    """
+    Wraps an iterator and adds up the time spent waiting for each item.
+    """
+
+    def __init__(self, iterable: Iterable):
+        self._iterator = iter(iterable)
+        self.elapsed = 0.0
+
+    def __iter__(self) -> Iterator:
+        return self
+
+    def __next__(self):
+        start = monotonic()
+        try:
+            return next(self._iterator)
+        finally:
+            self.elapsed += monotonic() - start
+
+
+def _percentile(values, fraction: float) -> float:
+    return values[min(int(len(values) * fraction), len(values) - 1)]
@@ -0,0 +1,59 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import plugin  # noqa: E402
+
+plugin.load()
+
+from calibre_plugins.store_annas_archive.core import AnnasArchive  # noqa: E402
+from mock_mirror import MockMirror  # noqa: E402
+
+
+@pytest.fixture
+def mirror():
+    with MockMirror(total_results=300) as m:
+        yield m
+
+
+@pytest.fixture
+def make_core(tmp_path):
+    """
+    Build an AnnasArchive for the given mirrors, with a cache and without an index unless asked for.
+    Mirror probing, the rate limit and prefetching are off so the tests only count their own requests.
+    """
+    cores = []
+
+    def make(mirrors, cache=True, index=False, covers=False, **config):
+        config = {'mirrors': list(mirrors), 'mirror_probe_time': time.time(), 'rate_limit': 0, 'prefetch': 0,
+                  **config}
+        core = AnnasArchive(config, str(tmp_path / 'cache.sqlite') if cache else None,
+                            str(tmp_path / 'index.sqlite') if index else None,
+                            str(tmp_path / 'covers') if covers else None)
+        cores.append(core)
+        return core
+
+    yield make
+    for core in cores:
+        core.session.close()
+
+
+@pytest.fixture
+def background():
+    """
+    Wait for the plugin's background threads with the given names to finish.
+    """
+
+    def wait(*names: str, timeout: float = 10):
+        end = time.monotonic() + timeout
+        while any(thread.name in names and thread.is_alive() for thread in threading.enumerate()):
+            if time.monotonic() > end:
+                raise AssertionError(f'{names} still running after {timeout} seconds')
+            time.sleep(0.01)
+
+    return wait
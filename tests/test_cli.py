@@ -0,0 +1,18 @@
+import json
+import time
+
+from calibre_plugins.store_annas_archive import cli
+
+CONFIG = {'mirror_probe_time': time.time(), 'rate_limit': 0, 'prefetch': 0}
+
+
+def test_search_prints_a_line_per_result(mirror, capsys):
+    assert cli.main(['--mirror', mirror.url, 'search', 'hello', 'world', '--max-results', '5'], CONFIG) == 0
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(results) == 10
+    assert {result['query'] for result in results} == {'hello', 'world'}
+
+
+def test_failed_searches_fail_the_command(capsys):
+    assert cli.main(['--mirror', 'http://127.0.0.1:1', '--timeout', '2', 'search', 'hello'], CONFIG) == 1
+    assert 'Error: 1 of the searches failed' in capsys.readouterr().err
@@ -0,0 +1,43 @@
+import time
+
+from mock_mirror import MockMirror
+
+
+class SlowCoverMirror(MockMirror):
+    """
+    Takes 2 seconds to send each cover.
+    """
+
+    def handle(self, handler, body):
+        if handler.path.startswith('/covers300/'):
+            time.sleep(2)
+        super().handle(handler, body)
+
+
+def test_rows_do_not_wait_for_their_covers(make_core):
+    with SlowCoverMirror(total_results=100) as mirror:
+        core = make_core([mirror.url], covers=True)
+        fetched = {}
+
+        def add(row, cover):
+            fetched[row] = cover
+
+        start = time.monotonic()
+        results = list(core.with_covers(core.search('example', 10, 10), add))
+        assert time.monotonic() - start < 1
+        assert len(results) == 10
+        assert all(cover is None for _, cover in results)
+
+        core.cover_prefetcher.join(10)
+        # The callbacks run right after the futures are done
+        end = time.monotonic() + 1
+        while len(fetched) < 10 and time.monotonic() < end:
+            time.sleep(0.01)
+        # The search page and every cover once
+        assert mirror.requests == 1 + 10
+        assert set(fetched) == {row for row, _ in results}
+        assert all(fetched.values())
+        mirror.reset_counters()
+        results = list(core.with_covers(core.search('example', 10, 10)))
+        assert all(cover for _, cover in results)
+        assert mirror.requests == 0
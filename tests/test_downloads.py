@@ -0,0 +1,68 @@
+import threading
+
+from calibre_plugins.store_annas_archive.constants import UNVERIFIED
+from calibre_plugins.store_annas_archive.limits import TokenBucket
+from mock_mirror import MockMirror, md5_for
+
+
+class MissingZlibMirror(MockMirror):
+    """
+    Z-Library's download links are gone.
+    """
+
+    def handle(self, handler, body):
+        if handler.path.startswith('/dl/'):
+            with self._lock:
+                self.requests += 1
+            self.send(handler, 404, b'Not Found', 'text/plain', body)
+        else:
+            super().handle(handler, body)
+
+
+def test_second_lookup_is_served_from_cache(mirror, make_core):
+    core = make_core([mirror.url], link={'max_links': 0})
+    downloads = core.get_downloads(md5_for(0), 'mobi', 10)
+    assert list(downloads) == ['Libgen.li.mobi', 'Libgen.rs Fiction.mobi', 'Sci-Hub: 10.1000/example.mobi',
+                               'Z-Library.mobi']
+
+    # Not from the prefetcher, which keeps the downloads of the last lookups too
+    core.prefetcher.clear()
+    mirror.reset_counters()
+    assert core.get_downloads(md5_for(0), 'mobi', 10) == downloads
+    assert mirror.requests == 0
+
+
+def test_max_links_stops_resolving_early(mirror, make_core):
+    core = make_core([mirror.url], link={'max_links': 1})
+    assert list(core.get_downloads(md5_for(0), 'mobi', 10)) == ['Libgen.li.mobi']
+    # The book's page and the one link
+    assert mirror.requests == 2
+    assert core.stats.counters()['details.skipped'] == 3
+
+
+def test_links_are_verified_in_the_background(make_core):
+    with MissingZlibMirror(total_results=100) as mirror:
+        core = make_core([mirror.url], link={'max_links': 0, 'content_type': True})
+        calls = []
+        checked = threading.Event()
+
+        def verified(downloads):
+            calls.append(downloads)
+            if not any(UNVERIFIED in name for name in downloads):
+                checked.set()
+
+        downloads = core.get_downloads(md5_for(0), 'mobi', 10, verified)
+        assert len(downloads) == 4
+        assert all(name.endswith(UNVERIFIED + '.mobi') for name in downloads)
+        assert checked.wait(10)
+    assert list(calls[-1]) == ['Libgen.li.mobi', 'Libgen.rs Fiction.mobi', 'Sci-Hub: 10.1000/example.mobi']
+
+
+def test_links_stay_cached_when_resolving_them_runs_out_of_time(mirror, make_core):
+    core = make_core([mirror.url])
+    for resolver in core.resolvers.resolvers:
+        # Used up for the next hour, so resolving any link runs out of time
+        resolver.rate_limit = TokenBucket(1 / 3600, 1)
+        resolver.rate_limit.acquire()
+    assert core.get_downloads(md5_for(0), 'mobi', 2) == {}
+    assert core.cache.get('md5:' + md5_for(0)) is not None
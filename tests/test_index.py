@@ -0,0 +1,55 @@
+from calibre_plugins.store_annas_archive.results import Row
+from mock_mirror import MockMirror, md5_for
+
+
+def test_results_from_the_index_count_towards_max_results(mirror, make_core, background):
+    core = make_core([mirror.url], cache=False, index=True)
+    assert len(list(core.search('example', 10, 10))) == 10
+    background('AnnasArchivePage')
+    assert core.index.size() == 100
+
+    md5s = [row.md5 for row in core.search('example', 10, 10)]
+    assert len(md5s) == 10
+    assert len(set(md5s)) == 10
+    assert len(list(core.search_many(['example', 'volume'], 10, 10))) == 20
+
+
+def test_rows_are_indexed_while_the_page_is_read(make_core):
+    with MockMirror(total_results=100, chunk_size=4096, chunk_delay=0.05) as mirror:
+        core = make_core([mirror.url], cache=False, index=True)
+        search = core.search('example', 100, 30)
+        for _ in range(50):
+            next(search)
+        # The page is still being read
+        assert 20 <= core.index.size() < 100
+        assert len(list(search)) == 50
+    assert core.index.size() == 100
+
+
+def test_index_makes_up_for_the_mirrors_being_down(mirror, make_core, background):
+    core = make_core([mirror.url], cache=False, index=True)
+    list(core.search('example', 10, 10))
+    background('AnnasArchivePage')
+
+    logged = []
+    core.log = logged.append
+    core.config['mirrors'] = ['http://127.0.0.1:1']
+    md5s = [row.md5 for row in core.search('example', 10, 5)]
+    assert len(md5s) == 10
+    assert set(md5s) <= {md5_for(i) for i in range(100)}
+    assert core.stats.counters()['index.offline'] == 1
+    assert len(logged) == 1
+
+
+def test_index_is_only_a_fallback_with_search_options_it_doesnt_know(mirror, make_core):
+    core = make_core([mirror.url], cache=False, index=True)
+    seen_before = Row('0' * 32, 'Example seen before', 'Someone', 'epub', '')
+    core.index.add([seen_before])
+    assert list(core.search('example', 10, 10))[0] == seen_before
+
+    core.config['search'] = {'content': ['book_fiction']}
+    md5s = [row.md5 for row in core.search('example', 10, 10)]
+    assert md5s == [md5_for(i) for i in range(10)]
+
+    core.config['mirrors'] = ['http://127.0.0.1:1']
+    assert [row.md5 for row in core.search('seen before', 10, 5)] == [seen_before.md5]
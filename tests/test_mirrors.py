@@ -0,0 +1,40 @@
+from mock_mirror import MockMirror
+
+from calibre_plugins.store_annas_archive.mirrors import FAILURE_THRESHOLD, CircuitBreaker, MirrorHealth
+
+
+def test_running_out_of_time_does_not_count_against_the_mirror(make_core, background):
+    # A page takes about 3 seconds to stream, longer than the searches may take
+    with MockMirror(total_results=100, chunk_size=4096, chunk_delay=0.1) as mirror:
+        core = make_core([mirror.url], cache=False)
+        for _ in range(2):
+            rows = list(core.search('hello', 100, 1))
+            assert 0 < len(rows) < 100
+        background('AnnasArchivePage')
+    stats = core.mirror_health.get(mirror.url)
+    assert stats is None or stats['error_rate'] == 0
+    assert core.mirror_health.state(mirror.url) == CircuitBreaker.CLOSED
+    assert core.stats.counters()['search.deadline_exceeded'] == 2
+
+
+def test_half_open_trial_is_only_taken_when_the_mirror_is_tried():
+    health = MirrorHealth({}, None)
+    health.record_success('https://good', 0.1)
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure('https://bad')
+    # The backoff is over
+    health.breakers['https://bad'].open_until = 0
+    assert health.state('https://bad') == CircuitBreaker.HALF_OPEN
+
+    for _ in range(3):
+        # The good mirror answers, so the bad one is never tried
+        mirrors = health.available(['https://bad', 'https://good'])
+        assert mirrors == ['https://good', 'https://bad']
+        assert health.try_acquire(mirrors[0])
+
+    assert health.try_acquire('https://bad')
+    # Only one trial request at a time
+    assert not health.try_acquire('https://bad')
+    assert health.available(['https://bad', 'https://good']) == ['https://good']
+    health.record_success('https://bad', 0.1)
+    assert health.state('https://bad') == CircuitBreaker.CLOSED
@@ -0,0 +1,102 @@
+from threading import Event
+
+from mock_mirror import MockMirror, md5_for
+
+
+class BrokenMirror(MockMirror):
+    """
+    Breaks the connection half way through every search page.
+    """
+
+    def send(self, handler, status, data, content_type, body):
+        if not (body and handler.path.startswith('/search')):
+            return super().send(handler, status, data, content_type, body)
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(data)))
+        handler.end_headers()
+        handler.wfile.write(data[:len(data) // 2])
+        handler.close_connection = True
+
+
+class ReversedMirror(MockMirror):
+    """
+    Has the same results as the other mirrors, but the other way around on every page.
+    """
+
+    def search_page(self, page: int) -> bytes:
+        start = (page - 1) * 100
+        rows = ''.join(
+            self.row.replace('{md5}', md5_for(i)).replace('{i}', str(i))
+            for i in reversed(range(start, min(start + 100, self.total_results)))
+        )
+        return self.page.replace('{rows}', rows).encode('utf-8')
+
+
+class OverlappingMirror(MockMirror):
+    """
+    Repeats the last 5 results of the previous page at the start of every page, like when new books are added
+    between requests.
+    """
+
+    def search_page(self, page: int) -> bytes:
+        start = max((page - 1) * 95 - 5, 0) if page > 1 else 0
+        rows = ''.join(
+            self.row.replace('{md5}', md5_for(i)).replace('{i}', str(i))
+            for i in range(start, min(start + 100, self.total_results))
+        )
+        return self.page.replace('{rows}', rows).encode('utf-8')
+
+
+def test_repeat_search_is_served_from_cache(mirror, make_core, background):
+    core = make_core([mirror.url])
+    assert len(list(core.search('hello', 10, 10))) == 10
+    # The rest of the page is read after the search has its 10 rows
+    background('AnnasArchivePage')
+    assert core.working_mirror == mirror.url
+    assert core.mirror_health.get(mirror.url)['error_rate'] == 0
+
+    mirror.reset_counters()
+    rows = list(core.search('hello', 10, 10))
+    assert [row.md5 for row in rows] == [md5_for(i) for i in range(10)]
+    assert mirror.requests == 0
+    assert core.stats.counters()['cache.search.hit'] == 1
+
+
+def test_results_are_in_order(mirror, make_core):
+    core = make_core([mirror.url], cache=False, concurrent_pages=3)
+    rows = list(core.search('hello', 250, 10))
+    assert [row.md5 for row in rows] == [md5_for(i) for i in range(250)]
+
+
+def test_duplicates_across_pages_are_skipped(make_core):
+    with OverlappingMirror(total_results=1000) as mirror:
+        core = make_core([mirror.url], cache=False)
+        md5s = [row.md5 for row in core.search('hello', 200, 10)]
+    assert len(md5s) == 200
+    assert len(set(md5s)) == 200
+    assert core.stats.counters()['search.duplicates'] > 0
+
+
+def test_failover_skips_rows_that_were_already_read(make_core):
+    with BrokenMirror(total_results=100) as broken, ReversedMirror(total_results=100) as reversed_mirror:
+        core = make_core([broken.url, reversed_mirror.url], cache=False)
+        md5s = [row.md5 for row in core.search('hello', 100, 10)]
+    assert len(md5s) == 100
+    assert set(md5s) == {md5_for(i) for i in range(100)}
+    # The rows from before the connection broke come first, in the order of the first mirror
+    assert md5s[:5] == [md5_for(i) for i in range(5)]
+    assert core.stats.counters()['search.retries'] == 1
+
+
+def test_stopped_batch_skips_the_searches_that_have_not_started(make_core):
+    with MockMirror(total_results=100, latency=0.2) as mirror:
+        core = make_core([mirror.url], cache=False)
+        stop = Event()
+        found = []
+        for query, _ in core.search_many([f'query {i}' for i in range(20)], 5, 10, workers=2, stop=stop):
+            found.append(query)
+            stop.set()
+    assert len(found) == 1
+    # Only the searches that were already running when it stopped
+    assert mirror.requests <= 3
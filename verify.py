@@ -0,0 +1,137 @@
+from contextlib import closing, nullcontext
+from http.client import HTTPException
+from queue import Queue
+from threading import Lock, Thread
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+
+from calibre_plugins.store_annas_archive.cache import Cache
+from calibre_plugins.store_annas_archive.session import Session
+from calibre_plugins.store_annas_archive.stats import Stats
+
+__all__ = ('LinkVerifier', 'Verdict')
+
+# The status, content type and size of a url
+Verdict = Dict[str, Any]
+VerifiedCallback = Callable[[str, Optional[Verdict]], None]
+
+
+class LinkVerifier:
+    """
+    Checks download links with HEAD requests on daemon worker threads.
+    The verdict of each url is kept for ttl seconds, in memory and in the cache if there is one,
+    so a url that has been checked isn't checked again.
+    """
+
+    def __init__(self, session: Session, workers: int, timeout: float, ttl: float, stats: Optional[Stats] = None):
+        self.session = session
+        self.workers = workers
+        self.timeout = timeout
+        self.ttl = ttl
+        self.stats = stats
+        self._lock = Lock()
+        self._queue: Queue = Queue()
+        self._threads: List[Thread] = []
+        self._verdicts: Dict[str, Tuple[float, Verdict]] = {}
+        self._waiting: Dict[str, List[VerifiedCallback]] = {}
+
+    @staticmethod
+    def is_good(verdict: Verdict) -> bool:
+        """
+        Whether the url is a file, and not e.g. a page asking to wait or to solve a captcha.
+        """
+        return verdict['status'] < 400 and verdict['content_type'].split('/')[0] == 'application'
+
+    def verdict(self, url: str, cache: Optional[Cache] = None) -> Optional[Verdict]:
+        """
+        The verdict of url if it has been checked, None otherwise.
+        """
+        now = monotonic()
+        with self._lock:
+            expires, verdict = self._verdicts.get(url, (0, None))
+        if expires > now:
+            return verdict
+        if cache is not None:
+            verdict = cache.get('verdict:' + url)
+            if verdict is not None:
+                with self._lock:
+                    self._prune()
+                    self._verdicts[url] = (now + self.ttl, verdict)
+                return verdict
+        return None
+
+    def verify(self, url: str, done: VerifiedCallback, cache: Optional[Cache] = None):
+        """
+        Check url in the background and call done with it and its verdict, from a worker thread.
+        The verdict is None if the check didn't tell, e.g. because the request timed out.
+        A url that is already being checked isn't checked twice, done is called when that check finishes.
+        """
+        with self._lock:
+            if url in self._waiting:
+                self._waiting[url].append(done)
+                return
+            self._waiting[url] = [done]
+            if len(self._threads) < self.workers:
+                thread = Thread(target=self._work, name='AnnasArchiveVerify', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put((url, cache))
+
+    def clear(self):
+        with self._lock:
+            self._verdicts.clear()
+
+    def _prune(self):
+        now = monotonic()
+        for url in [url for url, (expires, _) in self._verdicts.items() if expires <= now]:
+            del self._verdicts[url]
+
+    def _work(self):
+        while True:
+            url, cache = self._queue.get()
+            verdict = None
+            try:
+                verdict = self._check(url)
+                if verdict is not None:
+                    with self._lock:
+                        self._prune()
+                        self._verdicts[url] = (monotonic() + self.ttl, verdict)
+                    if cache is not None:
+                        cache.set('verdict:' + url, verdict, self.ttl)
+            finally:
+                with self._lock:
+                    callbacks = self._waiting.pop(url, [])
+                for done in callbacks:
+                    try:
+                        done(url, verdict)
+                    except Exception:
+                        # Don't let a broken callback stop the worker
+                        self._count('verify.callback_errors')
+
+    def _check(self, url: str) -> Optional[Verdict]:
+        try:
+            with self._timer(urlsplit(url).netloc), closing(self.session.head(url, timeout=self.timeout)) as resp:
+                status, headers = resp.status, resp.info()
+        except HTTPError as e:
+            # Other errors, like 405 for HEAD requests or 5xx, don't say anything about the file
+            if e.code not in (404, 410):
+                self._count('verify.inconclusive')
+                return None
+            status, headers = e.code, e.headers
+        except (HTTPException, OSError, ValueError):
+            self._count('verify.inconclusive')
+            return None
+        size = headers.get('Content-Length', '')
+        verdict = {'status': status, 'content_type': headers.get_content_type(),
+                   'size': int(size) if size.isdigit() else None}
+        self._count(f"verify.{'good' if self.is_good(verdict) else 'bad'}")
+        return verdict
+
+    def _timer(self, host: str):
+        return nullcontext() if self.stats is None else self.stats.timer('verify', host)
+
+    def _count(self, name: str):
+        if self.stats is not None:
+            self.stats.count(name)
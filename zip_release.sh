@@ -1,3 +1,3 @@
 #!/bin/bash
 version=$(grep ' version' __init__.py | sed -r "s/^.*version\s*= \(([0-9]+), ([0-9]+), ([0-9]+)\).*/\1.\2.\3/")
-zip "calibre_annas_archive-v${version}.zip" README.md plugin-import-name-store_annas_archive.txt __init__.py annas_archive.py config.py constants.py
\ No newline at end of file
+zip "calibre_annas_archive-v${version}.zip" README.md plugin-import-name-store_annas_archive.txt __init__.py annas_archive.py batch.py cache.py cli.py config.py constants.py core.py covers.py deadline.py index.py limits.py mirrors.py prefetch.py resolvers.py results.py session.py stats.py verify.py
\ No newline at end of file